@@ -0,0 +1,236 @@
+"""Append-only binary mailbox for cryptochat messages.
+
+A mailbox ``<name>.mbox`` holds any number of messages for one recipient::
+
+    file   := MAGIC record*
+    record := length:u32 fingerprint:8s padding:u16 width:u16 count:u32 block*count [session:8s sealed]
+    block  := width bytes, big-endian ciphertext integer
+
+When the high bit of ``width`` (``SEALED``) is set, the message is encrypted
+with a session key (see ``chat_session``): the blocks hold the RSA-wrapped
+session key, or nothing once the session is established, and the rest of the
+record is the session id followed by the sealed message bytes.
+
+``length`` counts the bytes after itself, so the file can be scanned without
+parsing the blocks. Next to it, ``<name>.mbox.idx`` stores how many messages
+have been read plus the offset of every record; readers mmap the mailbox and
+only decode the unread records. The index is a cache: when it is missing or
+behind the mailbox (e.g. after a crash between the two writes) the missing
+tail is rescanned. A truncated last record is ignored.
+
+Read messages stay in the file until :meth:`Mailbox.compact` rewrites it.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+MAGIC = b"RSAMBOX1"
+INDEX_MAGIC = b"RSAMIDX1"
+
+_LENGTH = struct.Struct(">I")
+_HEADER = struct.Struct(">8sHHI")
+_INDEX_HEADER = struct.Struct(">8sQ")
+_OFFSET = struct.Struct(">Q")
+
+# Flag in the width field marking a session-encrypted record.
+SEALED = 0x8000
+SESSION_ID_SIZE = 8
+
+
+@dataclass(frozen=True)
+class MailRecord:
+    """One encrypted message."""
+
+    sender: str
+    padding: int
+    blocks: List[int]
+    session: Optional[bytes] = None
+    sealed: bytes = b""
+
+
+def encode_record(
+    sender: str, padding: int, blocks: List[int], session: Optional[bytes] = None, sealed: bytes = b""
+) -> bytes:
+    """Serialize a message; ``sender`` is a 16-hex-digit key fingerprint.
+
+    With ``session`` set, ``sealed`` is the session-encrypted message and
+    ``blocks`` the wrapped session key (possibly empty).
+    """
+    width = max([(int(b).bit_length() + 7) // 8 for b in blocks] + [1])
+    if width >= SEALED:
+        raise ValueError("ciphertext blocks are too wide for the mailbox format")
+    body = b"".join(int(b).to_bytes(width, "big") for b in blocks)
+    if session is not None:
+        if len(session) != SESSION_ID_SIZE:
+            raise ValueError(f"session id must be {SESSION_ID_SIZE} bytes")
+        width |= SEALED
+        body += session + sealed
+    header = _HEADER.pack(bytes.fromhex(sender), padding, width, len(blocks))
+    return _LENGTH.pack(len(header) + len(body)) + header + body
+
+
+def _decode_record(view, offset: int) -> MailRecord:
+    (length,) = _LENGTH.unpack_from(view, offset)
+    end = offset + _LENGTH.size + length
+    start = offset + _LENGTH.size
+    fingerprint, padding, width, count = _HEADER.unpack_from(view, start)
+    start += _HEADER.size
+    sealed = width & SEALED
+    width &= ~SEALED
+    blocks = [int.from_bytes(view[i : i + width], "big") for i in range(start, start + width * count, width)]
+    if not sealed:
+        return MailRecord(fingerprint.hex(), padding, blocks)
+    start += width * count
+    session = bytes(view[start : start + SESSION_ID_SIZE])
+    return MailRecord(fingerprint.hex(), padding, blocks, session, bytes(view[start + SESSION_ID_SIZE : end]))
+
+
+class Mailbox:
+    """A recipient's mailbox file plus its offset index."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.index_path = path + ".idx"
+        self._read = 0
+        self._offsets: List[int] = []
+        self._end = 0
+        self._load_index()
+
+    # Index maintenance
+
+    def _file_size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def _load_index(self) -> None:
+        self._read, self._offsets = 0, []
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+            if len(data) >= _INDEX_HEADER.size:
+                magic, read = _INDEX_HEADER.unpack_from(data)
+                if magic == INDEX_MAGIC:
+                    count = (len(data) - _INDEX_HEADER.size) // _OFFSET.size
+                    self._offsets = [
+                        _OFFSET.unpack_from(data, _INDEX_HEADER.size + i * _OFFSET.size)[0] for i in range(count)
+                    ]
+                    self._read = min(read, count)
+        self._catch_up()
+
+    def _catch_up(self) -> None:
+        """Index records appended after the last indexed one."""
+        size = self._file_size()
+        if size < len(MAGIC):
+            self._offsets, self._read, self._end = [], 0, 0
+            return
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a mailbox file")
+            position = len(MAGIC)
+            if self._offsets:
+                last = self._offsets[-1]
+                f.seek(last)
+                raw = f.read(_LENGTH.size)
+                if len(raw) < _LENGTH.size or last + _LENGTH.size + _LENGTH.unpack(raw)[0] > size:
+                    # Index does not match the file: rebuild it from scratch.
+                    self._offsets, self._read = [], 0
+                else:
+                    position = last + _LENGTH.size + _LENGTH.unpack(raw)[0]
+            added = []
+            f.seek(position)
+            while position + _LENGTH.size <= size:
+                (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+                if position + _LENGTH.size + length > size:
+                    break
+                added.append(position)
+                position += _LENGTH.size + length
+                f.seek(position)
+        self._end = position
+        if added:
+            self._offsets.extend(added)
+            self._write_index()
+
+    def _write_index(self) -> None:
+        data = _INDEX_HEADER.pack(INDEX_MAGIC, self._read) + b"".join(_OFFSET.pack(o) for o in self._offsets)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.index_path)
+
+    # Public API
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def unread_count(self) -> int:
+        return len(self._offsets) - self._read
+
+    def append(
+        self, sender: str, padding: int, blocks: List[int], session: Optional[bytes] = None, sealed: bytes = b""
+    ) -> None:
+        """Append one message with a single write, then index it."""
+        record = encode_record(sender, padding, blocks, session, sealed)
+        self._catch_up()
+        if self._end and self._file_size() > self._end:
+            # Drop a record left half-written by a crash so it cannot hide this one.
+            os.truncate(self.path, self._end)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size == 0:
+                os.write(fd, MAGIC)
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+        self._catch_up()
+
+    def _records(self, first: int) -> Iterator[Tuple[int, MailRecord]]:
+        if first >= len(self._offsets):
+            return
+        with open(self.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for number in range(first, len(self._offsets)):
+                    yield number, _decode_record(view, self._offsets[number])
+
+    def unread(self) -> Iterator[MailRecord]:
+        """Decode the messages not yet marked as read, oldest first."""
+        self._catch_up()
+        for _number, record in self._records(self._read):
+            yield record
+
+    def mark_read(self, count: int | None = None) -> None:
+        """Mark the next ``count`` unread messages (default: all) as read."""
+        target = len(self._offsets) if count is None else min(len(self._offsets), self._read + count)
+        if target != self._read:
+            self._read = target
+            self._write_index()
+
+    def compact(self) -> int:
+        """Drop read messages from the file. Returns the number removed."""
+        self._catch_up()
+        removed = self._read
+        if removed == 0:
+            return 0
+        keep_from = self._offsets[removed] if removed < len(self._offsets) else self._end
+        tmp = self.path + ".tmp"
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            dst.write(MAGIC)
+            src.seek(keep_from)
+            while True:
+                chunk = src.read(1 << 20)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        os.replace(tmp, self.path)
+        shift = keep_from - len(MAGIC)
+        self._offsets = [o - shift for o in self._offsets[removed:]]
+        self._read = 0
+        self._write_index()
+        return removed
@@ -0,0 +1,505 @@
+"""Asyncio client for the ``server.ts`` WebSocket relay.
+
+The relay broadcasts every packet to all other peers on ``chat_global``. This
+module speaks the same JSON packets as ``index.html`` (``presence`` and
+``message``) so Python peers can chat with browser peers.
+
+* Outgoing messages are pipelined: each one is encrypted as soon as it is
+  queued, and the sender only waits for the encryption of the oldest one.
+* Encryption and decryption run in a process pool, so the event loop never
+  blocks on modular exponentiation.
+* During bursts, every packet that is ready is written before one drain, so
+  a burst costs one flush instead of one per message.
+* A dropped connection is retried with exponential backoff and jitter;
+  queued messages survive the reconnect. A packet is only dropped from the
+  queue once the write carrying it has drained, so delivery is at least once.
+
+A minimal RFC 6455 implementation is included (text frames, ping/pong, close)
+so no third-party WebSocket package is needed, plus :class:`LocalRelay`, a
+pure-Python stand-in for ``server.ts`` used by tests and
+``relay_loadtest.py``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import collections
+import hashlib
+import itertools
+import json
+import os
+import random
+import ssl
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import rsa
+
+_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# Largest number of ready packets written before a single drain.
+BATCH_MAX = 256
+
+# Reconnect backoff bounds, in seconds.
+BACKOFF_MIN = 0.5
+BACKOFF_MAX = 30.0
+
+
+class ConnectionClosed(Exception):
+    """The WebSocket peer closed the connection."""
+
+
+# WebSocket framing
+
+
+def _accept_key(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + _GUID).encode("ascii")).digest()).decode("ascii")
+
+
+def _mask(payload: bytes, key: bytes) -> bytes:
+    if not payload:
+        return payload
+    repeated = (key * (len(payload) // 4 + 1))[: len(payload)]
+    masked = int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")
+    return masked.to_bytes(len(payload), "big")
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool) -> bytes:
+    """A single final frame; clients must set ``mask``."""
+    head = bytearray([0x80 | opcode])
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        head.append(mask_bit | length)
+    elif length < 1 << 16:
+        head.append(mask_bit | 126)
+        head += struct.pack(">H", length)
+    else:
+        head.append(mask_bit | 127)
+        head += struct.pack(">Q", length)
+    if mask:
+        key = os.urandom(4)
+        return bytes(head) + key + _mask(payload, key)
+    return bytes(head) + payload
+
+
+class WebSocket:
+    """One open WebSocket connection over asyncio streams."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, is_client: bool) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.is_client = is_client
+
+    def write_text(self, text: str) -> None:
+        """Buffer a text frame; call :meth:`drain` to flush."""
+        self.writer.write(encode_frame(OP_TEXT, text.encode("utf-8"), self.is_client))
+
+    async def drain(self) -> None:
+        await self.writer.drain()
+
+    async def send_text(self, text: str) -> None:
+        self.write_text(text)
+        await self.drain()
+
+    async def _read_frame(self) -> Tuple[bool, int, bytes]:
+        first, second = await self.reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            (length,) = struct.unpack(">H", await self.reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack(">Q", await self.reader.readexactly(8))
+        key = await self.reader.readexactly(4) if second & 0x80 else None
+        payload = await self.reader.readexactly(length)
+        if key is not None:
+            payload = _mask(payload, key)
+        return bool(first & 0x80), first & 0x0F, payload
+
+    async def recv(self) -> str:
+        """Next text (or binary, decoded as UTF-8) message; answers pings."""
+        _opcode, message = await self.recv_message()
+        return message.decode("utf-8")
+
+    async def recv_message(self) -> Tuple[int, bytes]:
+        """Next data message as (opcode of its first frame, payload); answers pings."""
+        message = b""
+        message_opcode = None
+        while True:
+            try:
+                fin, opcode, payload = await self._read_frame()
+            except (asyncio.IncompleteReadError, ConnectionError) as exc:
+                raise ConnectionClosed() from exc
+            if opcode == OP_PING:
+                self.writer.write(encode_frame(OP_PONG, payload, self.is_client))
+                await self.drain()
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                try:
+                    self.writer.write(encode_frame(OP_CLOSE, payload[:2], self.is_client))
+                    await self.drain()
+                except ConnectionError:
+                    pass
+                raise ConnectionClosed()
+            if message_opcode is None:
+                message_opcode = opcode
+            message += payload
+            if fin:
+                return message_opcode, message
+
+    async def send_message(self, opcode: int, payload: bytes) -> None:
+        self.writer.write(encode_frame(opcode, payload, self.is_client))
+        await self.drain()
+
+    async def close(self) -> None:
+        try:
+            self.writer.write(encode_frame(OP_CLOSE, struct.pack(">H", 1000), self.is_client))
+            await self.drain()
+        except ConnectionError:
+            pass
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def ws_connect(url: str) -> WebSocket:
+    """Open a client connection to a ``ws://`` or ``wss://`` URL."""
+    parts = urlsplit(url)
+    secure = parts.scheme == "wss"
+    host = parts.hostname or "localhost"
+    port = parts.port or (443 if secure else 80)
+    reader, writer = await asyncio.open_connection(
+        host, port, ssl=ssl.create_default_context() if secure else None
+    )
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    request = (
+        f"GET {parts.path or '/'} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n\r\n"
+    )
+    writer.write(request.encode("ascii"))
+    await writer.drain()
+
+    status = await reader.readline()
+    headers = await _read_headers(reader)
+    if b" 101 " not in status or headers.get("sec-websocket-accept") != _accept_key(key):
+        writer.close()
+        raise ConnectionError(f"WebSocket handshake failed: {status.decode('latin-1').strip()}")
+    return WebSocket(reader, writer, is_client=True)
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            return headers
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+# Local relay stand-in
+
+
+class LocalRelay:
+    """In-process stand-in for ``server.ts``: relays every message to all other peers.
+
+    Create process pools before :meth:`start`; forked workers would otherwise
+    inherit the listening socket and keep the port open after :meth:`close`.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Set[WebSocket] = set()
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await asyncio.gather(*(peer.close() for peer in list(self._peers)))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.readline()
+        headers = await _read_headers(reader)
+        key = headers.get("sec-websocket-key")
+        if key is None:
+            body = b"Relay server running. Connect via WebSocket."
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            writer.close()
+            return
+        writer.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {_accept_key(key)}\r\n\r\n"
+            ).encode("ascii")
+        )
+        peer = WebSocket(reader, writer, is_client=False)
+        self._peers.add(peer)
+        try:
+            while True:
+                # Frames are relayed as they are, like server.ts does (binary
+                # or invalid UTF-8 included).
+                opcode, message = await peer.recv_message()
+                for other in list(self._peers):
+                    if other is not peer:
+                        try:
+                            await other.send_message(opcode, message)
+                        except ConnectionError:
+                            self._peers.discard(other)
+        except (ConnectionClosed, OSError):
+            pass
+        finally:
+            self._peers.discard(peer)
+            writer.close()
+
+
+# Chat client
+
+
+def _encrypt(text: str, n: int, e: int, padding: int) -> str:
+    """Pool worker: encrypt and serialize like index.html does."""
+    return " ".join(str(c) for c in rsa.encrypt_string(text, n, e, padding))
+
+
+def _decrypt(data: str, n: int, d: int, padding: int) -> str:
+    """Pool worker: parse and decrypt a ``message`` packet payload."""
+    return rsa.decrypt_string([int(c) for c in data.split(" ")], n, d, padding)
+
+
+@dataclass(frozen=True)
+class IncomingMessage:
+    """A decrypted message addressed to this client."""
+
+    from_name: str
+    from_n: int
+    from_e: int
+    text: str
+
+
+class RelayClient:
+    """Chat peer on the relay, compatible with the browser client's packets.
+
+    Use as ``async with RelayClient(...) as client:``; then ``await
+    client.send(n, e, text)`` to queue messages and ``await client.receive()``
+    (or iterate ``client.inbox``) for decrypted incoming ones.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        name: str,
+        n: int,
+        e: int,
+        d: int,
+        padding: int = 0,
+        pool: Optional[ProcessPoolExecutor] = None,
+    ) -> None:
+        self.url = url
+        self.name = name
+        self.n, self.e, self.d = n, e, d
+        self.padding = padding
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.peers: Dict[str, dict] = {}
+        self.connected = asyncio.Event()
+        self._pool = pool
+        self._own_pool = pool is None
+        # (to_n, to_e, future of the serialized ciphertext); to_n None = presence.
+        self._outgoing: Deque[tuple] = collections.deque()
+        self._ready = asyncio.Event()
+        self._flushed = asyncio.Event()
+        self._flushed.set()
+        # (packet, future of the plaintext) in arrival order.
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        self._ws: Optional[WebSocket] = None
+        self._tasks: list = []
+
+    async def __aenter__(self) -> "RelayClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor()
+        self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._deliver_loop())]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._ws is not None:
+            await self._ws.close()
+        if self._own_pool and self._pool is not None:
+            self._pool.shutdown()
+
+    async def send(self, to_n: int, to_e: int, text: str) -> asyncio.Future:
+        """Queue a message; encryption starts immediately in the pool.
+
+        Returns the future of the serialized ciphertext. If encryption fails
+        (e.g. an invalid key) the future holds the error and the message is
+        dropped; later messages are still sent.
+        """
+        loop = asyncio.get_running_loop()
+        data = loop.run_in_executor(self._pool, _encrypt, text, to_n, to_e, self.padding)
+        self._enqueue((to_n, to_e, data))
+        return data
+
+    def send_presence(self) -> None:
+        """Queue a presence packet announcing our name and public key."""
+        done = asyncio.get_running_loop().create_future()
+        done.set_result(None)
+        self._enqueue((None, None, done))
+
+    def _enqueue(self, item: tuple) -> None:
+        self._outgoing.append(item)
+        self._flushed.clear()
+        self._ready.set()
+
+    async def receive(self) -> IncomingMessage:
+        return await self.inbox.get()
+
+    async def wait_outgoing(self) -> None:
+        """Wait until every queued message has been written to the relay."""
+        await self._flushed.wait()
+
+    # Internals
+
+    def _packet(self, to_n: Optional[int], to_e: Optional[int], data: Optional[str]) -> str:
+        if to_n is None:
+            return json.dumps({"type": "presence", "name": self.name, "n": str(self.n), "e": str(self.e)})
+        return json.dumps(
+            {
+                "type": "message",
+                "from_name": self.name,
+                "from_n": str(self.n),
+                "from_e": str(self.e),
+                "to_n": str(to_n),
+                "to_e": str(to_e),
+                "data": data,
+            }
+        )
+
+    async def _run(self) -> None:
+        delay = BACKOFF_MIN
+        while True:
+            try:
+                self._ws = await ws_connect(self.url)
+            except (OSError, ConnectionError):
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, BACKOFF_MAX)
+                continue
+            delay = BACKOFF_MIN
+            self.connected.set()
+            self.send_presence()
+            sender = asyncio.create_task(self._send_loop(self._ws))
+            try:
+                await self._receive_loop(self._ws)
+            except (ConnectionClosed, OSError):
+                pass
+            finally:
+                self.connected.clear()
+                sender.cancel()
+                try:
+                    await sender
+                except (asyncio.CancelledError, OSError):
+                    pass
+                self._ws.writer.close()
+
+    async def _send_loop(self, ws: WebSocket) -> None:
+        while True:
+            if not self._outgoing:
+                self._flushed.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            # Everything already queued goes out in one batch and one drain;
+            # encryption of later items keeps running while we wait on earlier ones.
+            batch = list(itertools.islice(self._outgoing, BATCH_MAX))
+            for to_n, to_e, data in batch:
+                # shield(): cancelling this task on a disconnect must not cancel
+                # the encryption, which the next sender still has to send.
+                try:
+                    payload = await asyncio.shield(data)
+                except asyncio.CancelledError:
+                    if not data.cancelled():
+                        raise
+                    continue  # the caller cancelled the future send() returned
+                except Exception:
+                    continue  # reported through the future send() returned
+                ws.write_text(self._packet(to_n, to_e, payload))
+            await ws.drain()
+            for _ in batch:
+                self._outgoing.popleft()
+
+    async def _receive_loop(self, ws: WebSocket) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            _opcode, raw = await ws.recv_message()
+            try:
+                packet = json.loads(raw.decode("utf-8"))
+            except ValueError:
+                continue  # not JSON, or not even UTF-8
+            if not isinstance(packet, dict):
+                continue
+            kind = packet.get("type")
+            if kind == "presence":
+                self.peers[packet.get("n")] = packet
+            elif kind == "delete_account":
+                self.peers.pop(packet.get("n"), None)
+            elif kind == "message" and packet.get("to_n") == str(self.n) and packet.get("to_e") == str(self.e):
+                data = packet.get("data")
+                if not isinstance(data, str):
+                    continue
+                plain = loop.run_in_executor(self._pool, _decrypt, data, self.n, self.d, self.padding)
+                self._incoming.put_nowait((packet, plain))
+
+    async def _deliver_loop(self) -> None:
+        """Move decrypted messages to the inbox, keeping their arrival order."""
+        while True:
+            packet, plain = await self._incoming.get()
+            try:
+                text = await plain
+            except Exception:
+                text = "[Error decrypting corrupt packet]"
+            try:
+                message = IncomingMessage(
+                    str(packet.get("from_name", "Unknown")), int(packet["from_n"]), int(packet["from_e"]), text
+                )
+            except (KeyError, TypeError, ValueError):
+                continue  # malformed sender fields
+            await self.inbox.put(message)
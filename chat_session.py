@@ -0,0 +1,142 @@
+"""Session keys for cryptochat.
+
+Encrypting every character with RSA costs one modular exponentiation per
+character. Instead, the first message to a contact creates a random session
+key and wraps it once with the contact's RSA key; that message and the
+following ones are encrypted with the session key. A new key is created after
+``ROTATE_AFTER_MESSAGES`` messages or ``ROTATE_AFTER_SECONDS`` seconds.
+
+Session keys are kept in the contact store, for both directions, so they
+survive restarts.
+
+The symmetric cipher is built from the standard library only: the keystream is
+SHAKE-256 over (key, nonce) (see :mod:`rsa.stream`) and an HMAC-SHA256 tag authenticates the nonce and
+ciphertext. Like the RSA part of this project it is meant for teaching, not
+for protecting real secrets.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import time
+from typing import List, Optional, Tuple
+
+import rsa
+from rsa.stream import keystream, xor
+from chat_mailbox import SESSION_ID_SIZE
+from chat_store import ContactStore, Session
+
+KEY_SIZE = 32
+NONCE_SIZE = 16
+TAG_SIZE = 16
+_STREAM_DOMAIN = b"cryptochat-stream"
+
+# A session key is replaced after this many messages or seconds.
+ROTATE_AFTER_MESSAGES = 100
+ROTATE_AFTER_SECONDS = 24 * 3600
+
+
+def _tag(key: bytes, nonce: bytes, ciphertext: bytes) -> bytes:
+    return hmac.new(key, nonce + ciphertext, hashlib.sha256).digest()[:TAG_SIZE]
+
+
+def seal(key: bytes, text: str) -> bytes:
+    """Encrypt and authenticate ``text``; returns nonce + ciphertext + tag."""
+    nonce = os.urandom(NONCE_SIZE)
+    data = text.encode("utf-8")
+    ciphertext = xor(data, keystream(_STREAM_DOMAIN, key, nonce, len(data)))
+    return nonce + ciphertext + _tag(key, nonce, ciphertext)
+
+
+def open_sealed(key: bytes, blob: bytes) -> str:
+    """Inverse of :func:`seal`. Raises ValueError if the message was altered."""
+    if len(blob) < NONCE_SIZE + TAG_SIZE:
+        raise ValueError("sealed message is truncated")
+    nonce, ciphertext, tag = blob[:NONCE_SIZE], blob[NONCE_SIZE:-TAG_SIZE], blob[-TAG_SIZE:]
+    if not hmac.compare_digest(tag, _tag(key, nonce, ciphertext)):
+        raise ValueError("sealed message failed authentication")
+    return xor(ciphertext, keystream(_STREAM_DOMAIN, key, nonce, len(ciphertext))).decode("utf-8")
+
+
+def _chunk_size(n: int, padding: int) -> int:
+    """Key bytes per RSA block, so that a padded chunk stays below ``n``."""
+    size = ((n // 10**padding).bit_length() - 1) // 8
+    if size < 1:
+        raise ValueError("modulus is too small to wrap a session key with this padding")
+    return size
+
+
+def wrap_key(key: bytes, n: int, e: int, padding: int) -> List[int]:
+    """Encrypt ``key`` with the RSA public key (n, e), a few bytes per block."""
+    size = _chunk_size(n, padding)
+    return [
+        rsa.encrypt_int(int.from_bytes(key[i : i + size], "big"), n, e, padding) for i in range(0, len(key), size)
+    ]
+
+
+def unwrap_key(blocks: List[int], n: int, d: int, padding: int) -> bytes:
+    """Inverse of :func:`wrap_key`."""
+    size = _chunk_size(n, padding)
+    if not blocks or len(blocks) != -(-KEY_SIZE // size):
+        raise ValueError("wrapped session key has the wrong number of blocks")
+    lengths = [size] * (len(blocks) - 1) + [KEY_SIZE - size * (len(blocks) - 1)]
+    try:
+        return b"".join(
+            rsa.decrypt_int(block, n, d, padding).to_bytes(length, "big") for block, length in zip(blocks, lengths)
+        )
+    except OverflowError:
+        raise ValueError("wrapped session key does not decrypt with this key") from None
+
+
+class SessionCache:
+    """Creates, rotates and looks up session keys stored in a ContactStore."""
+
+    def __init__(
+        self,
+        store: ContactStore,
+        max_messages: int = ROTATE_AFTER_MESSAGES,
+        max_age: float = ROTATE_AFTER_SECONDS,
+    ) -> None:
+        self.store = store
+        self.max_messages = max_messages
+        self.max_age = max_age
+
+    def _expired(self, session: Session) -> bool:
+        return session.messages >= self.max_messages or time.time() - session.created >= self.max_age
+
+    def outgoing(self, fingerprint: str, n: int, e: int, padding: int) -> Tuple[Session, List[int]]:
+        """Session to send the next message to the key (n, e) with.
+
+        Returns the session and the RSA-wrapped key, which is empty unless the
+        session was just created and the key still has to reach the recipient.
+        The message is counted towards rotation.
+        """
+        session = self.store.latest_session(fingerprint, "out")
+        wrapped: List[int] = []
+        if session is None or self._expired(session):
+            key = os.urandom(KEY_SIZE)
+            wrapped = wrap_key(key, n, e, padding)
+            session = Session(fingerprint, "out", os.urandom(SESSION_ID_SIZE), key, time.time(), 0)
+            self.store.save_session(session)
+        self.store.count_session_message(session)
+        return session, wrapped
+
+    def incoming(
+        self, fingerprint: str, session_id: bytes, wrapped: List[int], n: int, d: int, padding: int
+    ) -> Optional[bytes]:
+        """Key of a received session, unwrapping and storing it on first sight.
+
+        Returns None when the session is unknown and the message does not carry
+        its key (e.g. the message that did was lost).
+        """
+        session = self.store.get_session(fingerprint, "in", session_id)
+        if session is not None:
+            self.store.count_session_message(session)
+            return session.key
+        if not wrapped:
+            return None
+        key = unwrap_key(wrapped, n, d, padding)
+        self.store.save_session(Session(fingerprint, "in", session_id, key, time.time(), 1))
+        return key
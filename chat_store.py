@@ -0,0 +1,264 @@
+"""Contact and key store for cryptochat.
+
+Contacts live in a SQLite database in WAL mode. Every change is written in its
+own transaction, so nothing is lost if the program crashes, and contacts are
+only read when they are needed (lookups by name or key fingerprint hit an
+index instead of loading the whole address book).
+
+The legacy ``contactos.json`` file (a flat dict with positional keys ``'0'``,
+``'n1'``, ``'e1'``, ...) is imported once, the first time the database is
+opened, and then renamed to ``contactos.json.migrated``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+DEFAULT_DB = "contactos.db"
+LEGACY_JSON = "contactos.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profile (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    name TEXT NOT NULL,
+    n TEXT NOT NULL,
+    e TEXT NOT NULL,
+    d TEXT NOT NULL,
+    padding INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    fingerprint TEXT NOT NULL UNIQUE,
+    n TEXT NOT NULL,
+    e TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contacts_name ON contacts (name);
+CREATE TABLE IF NOT EXISTS sessions (
+    fingerprint TEXT NOT NULL,
+    direction TEXT NOT NULL CHECK (direction IN ('in', 'out')),
+    session_id BLOB NOT NULL,
+    key BLOB NOT NULL,
+    created REAL NOT NULL,
+    messages INTEGER NOT NULL,
+    PRIMARY KEY (fingerprint, direction, session_id)
+);
+"""
+
+
+def key_fingerprint(n: int, e: int) -> str:
+    """Short hex fingerprint identifying the public key (n, e)."""
+    return hashlib.sha256(f"{int(n)}:{int(e)}".encode("ascii")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class Profile:
+    """The local user's identity and keys."""
+
+    name: str
+    n: int
+    e: int
+    d: int
+    padding: int
+
+
+@dataclass(frozen=True)
+class Contact:
+    """A stored public key."""
+
+    id: int
+    name: str
+    fingerprint: str
+    n: int
+    e: int
+
+
+@dataclass(frozen=True)
+class Session:
+    """A symmetric session key shared with the owner of ``fingerprint``.
+
+    ``direction`` is ``'out'`` for keys we created to send with and ``'in'``
+    for keys received from that peer.
+    """
+
+    fingerprint: str
+    direction: str
+    session_id: bytes
+    key: bytes
+    created: float
+    messages: int
+
+
+def _contact(row) -> Contact:
+    return Contact(row[0], row[1], row[2], int(row[3]), int(row[4]))
+
+
+class ContactStore:
+    """SQLite-backed store for the local profile and contacts.
+
+    Integers are stored as decimal text because RSA moduli do not fit in
+    SQLite's 64-bit INTEGER.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB, legacy_json: Optional[str] = LEGACY_JSON) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO profile (id, name, n, e, d, padding) VALUES (0, 'Anonimo', '0', '0', '0', 0)"
+            )
+        if legacy_json is not None and os.path.isfile(legacy_json):
+            self.migrate_json(legacy_json)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "ContactStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # Profile
+
+    def profile(self) -> Profile:
+        row = self._conn.execute("SELECT name, n, e, d, padding FROM profile WHERE id = 0").fetchone()
+        return Profile(row[0], int(row[1]), int(row[2]), int(row[3]), int(row[4]))
+
+    def update_profile(self, **fields) -> None:
+        """Update some of ``name``, ``n``, ``e``, ``d`` and ``padding``."""
+        allowed = {"name", "n", "e", "d", "padding"}
+        unknown = set(fields) - allowed
+        if unknown:
+            raise ValueError(f"unknown profile fields: {sorted(unknown)}")
+        if not fields:
+            return
+        values = [str(v) if k in ("n", "e", "d") else v for k, v in fields.items()]
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._conn:
+            self._conn.execute(f"UPDATE profile SET {assignments} WHERE id = 0", values)
+
+    # Contacts
+
+    def add_contact(self, name: str, n: int, e: int) -> Contact:
+        """Store a contact, or rename the existing one with the same key."""
+        fingerprint = key_fingerprint(n, e)
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO contacts (name, fingerprint, n, e) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (fingerprint) DO UPDATE SET name = excluded.name",
+                (name, fingerprint, str(int(n)), str(int(e))),
+            )
+        contact = self.by_fingerprint(fingerprint)
+        assert contact is not None
+        return contact
+
+    def remove_contact(self, contact_id: int) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM contacts WHERE id = ?", (contact_id,))
+
+    def by_id(self, contact_id: int) -> Optional[Contact]:
+        row = self._conn.execute(
+            "SELECT id, name, fingerprint, n, e FROM contacts WHERE id = ?", (contact_id,)
+        ).fetchone()
+        return _contact(row) if row else None
+
+    def by_name(self, name: str) -> Optional[Contact]:
+        """Most recently added contact called ``name``."""
+        row = self._conn.execute(
+            "SELECT id, name, fingerprint, n, e FROM contacts WHERE name = ? ORDER BY id DESC LIMIT 1", (name,)
+        ).fetchone()
+        return _contact(row) if row else None
+
+    def by_fingerprint(self, fingerprint: str) -> Optional[Contact]:
+        row = self._conn.execute(
+            "SELECT id, name, fingerprint, n, e FROM contacts WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        return _contact(row) if row else None
+
+    def contacts(self) -> Iterator[Contact]:
+        """Iterate over contacts in insertion order without loading them all."""
+        cursor = self._conn.execute("SELECT id, name, fingerprint, n, e FROM contacts ORDER BY id")
+        for row in cursor:
+            yield _contact(row)
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+    # Sessions
+
+    def save_session(self, session: Session) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (fingerprint, direction, session_id, key, created, messages) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session.fingerprint, session.direction, session.session_id, session.key, session.created,
+                 session.messages),
+            )
+
+    def count_session_message(self, session: Session) -> None:
+        with self._conn:
+            self._conn.execute(
+                "UPDATE sessions SET messages = messages + 1 "
+                "WHERE fingerprint = ? AND direction = ? AND session_id = ?",
+                (session.fingerprint, session.direction, session.session_id),
+            )
+
+    def latest_session(self, fingerprint: str, direction: str) -> Optional[Session]:
+        row = self._conn.execute(
+            "SELECT fingerprint, direction, session_id, key, created, messages FROM sessions "
+            "WHERE fingerprint = ? AND direction = ? ORDER BY created DESC LIMIT 1",
+            (fingerprint, direction),
+        ).fetchone()
+        return Session(*row) if row else None
+
+    def get_session(self, fingerprint: str, direction: str, session_id: bytes) -> Optional[Session]:
+        row = self._conn.execute(
+            "SELECT fingerprint, direction, session_id, key, created, messages FROM sessions "
+            "WHERE fingerprint = ? AND direction = ? AND session_id = ?",
+            (fingerprint, direction, session_id),
+        ).fetchone()
+        return Session(*row) if row else None
+
+    # Migration
+
+    def migrate_json(self, path: str) -> int:
+        """Import a legacy ``contactos.json`` file and rename it.
+
+        Returns the number of contacts imported.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+
+        imported = 0
+        with self._conn:
+            self._conn.execute(
+                "UPDATE profile SET name = ?, n = ?, e = ?, d = ?, padding = ? WHERE id = 0",
+                (
+                    str(legacy.get("0", "Anonimo")),
+                    str(int(legacy.get("n0", 0))),
+                    str(int(legacy.get("e0", 0))),
+                    str(int(legacy.get("d0", 0))),
+                    int(legacy.get("p", 0)),
+                ),
+            )
+            index = 1
+            while str(index) in legacy:
+                n, e = int(legacy["n" + str(index)]), int(legacy["e" + str(index)])
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO contacts (name, fingerprint, n, e) VALUES (?, ?, ?, ?)",
+                    (str(legacy[str(index)]), key_fingerprint(n, e), str(n), str(e)),
+                )
+                imported += 1
+                index += 1
+
+        os.replace(path, path + ".migrated")
+        return imported
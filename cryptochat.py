@@ -1,33 +1,37 @@
-import json
 import rsa
 import os
 
+from chat_mailbox import Mailbox
+from chat_session import SessionCache, open_sealed, seal
+from chat_store import ContactStore, key_fingerprint
 
-if os.path.isfile("contactos.json"):
-    with open("contactos.json", "r", encoding="utf-8") as f:
-        f.seek(0)
-        contactos = json.load(f)
-else:
-    contactos = {'p':0, '0': 'Anonimo', 'n0': 0, 'e0': 0, 'd0': 0}        
+# Read messages are dropped from a mailbox once this many have piled up.
+COMPACT_AFTER = 64
+
+
+store = ContactStore()
+sessions = SessionCache(store)
+# Keys for an interval are generated in the background after the first request,
+# so asking for the same bounds again does not block the menu.
+key_pool = rsa.KeyPool(workers=1, default_target=2)
 
 
 def generate_and_register_keys():
     print("######## Generate keys ########")
     lower = int(input("Lower bound: "))
     upper = int(input("Upper bound: "))
-    n, e, d = rsa.generate_keys(lower, upper)
-    contactos['n0'] = n
-    contactos['e0'] = e
-    contactos['d0'] = d
+    n, e, d = key_pool.take(lower, upper)
+    store.update_profile(n=n, e=e, d=d)
     return "Keys generated and saved"
 
     
 def register_user():
     print("######## Register user ########")
-    contactos['0'] = input("Name: ")
-    contactos['n0'] = int(input("     n: "))
-    contactos['e0'] = int(input("     e: "))
-    contactos['d0'] = int(input("     d: "))
+    name = input("Name: ")
+    n = int(input("     n: "))
+    e = int(input("     e: "))
+    d = int(input("     d: "))
+    store.update_profile(name=name, n=n, e=e, d=d)
     return "Keys saved"
 
     
@@ -36,48 +40,80 @@ def register_contact():
     name = input("Name: ")
     n = int(input("     n: "))
     e = int(input("     e: "))
-    
-    i = (len(contactos)-2)//3
-    contactos[str(i)] = name
-    contactos['n'+str(i)] = n
-    contactos['e'+str(i)] = e
+
+    store.add_contact(name, n, e)
     return "Contact saved"
 
+
+def find_contact(reference: str):
+    """Look a contact up by its menu number, name or key fingerprint."""
+    reference = reference.strip()
+    if reference.isdigit():
+        contact = store.by_id(int(reference))
+        if contact is not None:
+            return contact
+    return store.by_name(reference) or store.by_fingerprint(reference)
+
     
 def encrypt_message():
     print("######## Message ########")
     print("Contacts")
-    if len(contactos) <= 5:
+    if len(store) == 0:
         return "No contacts"
-    for i in range(1,(len(contactos)-2)//3):
-
-        print("{}. {}".format(i,contactos[str(i)]))
-    try:
-        recipient = input("To: ")
-        n = contactos['n' + str(recipient)]
-        e = contactos['e' + str(recipient)]
-        p = contactos['p']
-    except Exception:
+    for contact in store.contacts():
+        print("{}. {} [{}]".format(contact.id, contact.name, contact.fingerprint))
+    recipient = find_contact(input("To: "))
+    if recipient is None:
         return "Contact not found"
+    me = store.profile()
+    n, e, p = recipient.n, recipient.e, me.padding
     main()
     print("######## Message ########")
-    print("To", contactos[recipient])
+    print("To", recipient.name)
     message = input("> ")
-    encrypted = rsa.encrypt_string(message, n, e, p)
-    serialized = "".join(str(value) + " " for value in encrypted)[:-1]
-        
-    with open(contactos[recipient] + ".txt", "w", encoding="utf-8") as f:
-        f.write(("From {} (n = {}, e = {})".format(contactos['0'], contactos['n0'], contactos['e0'])) + "\n")
-        f.write(("To {} (n = {}, e = {}, p = {})".format(contactos[recipient], n, e, p)) + "\n")
-        f.write(serialized)
+    # Only the first message of a session pays for RSA (wrapping the key).
+    session, wrapped = sessions.outgoing(recipient.fingerprint, n, e, p)
+    sealed = seal(session.key, message)
 
-    return "Encrypted message saved to {}.txt".format(contactos[recipient])
+    Mailbox(recipient.name + ".mbox").append(key_fingerprint(me.n, me.e), p, wrapped, session.session_id, sealed)
+    return "Encrypted message saved to {}.mbox".format(recipient.name)
 
 
 def decrypt_message():
     print("######## Message ########")
-    if os.path.isfile(contactos['0']+".txt"):
-        with open(contactos['0'] + ".txt", "r", encoding="utf-8") as f:
+    me = store.profile()
+    mailbox = Mailbox(me.name + ".mbox")
+    if mailbox.unread_count:
+        for record in mailbox.unread():
+            sender = store.by_fingerprint(record.sender)
+            decrypted = read_record(record, me)
+            print("From", sender.name if sender else record.sender, decrypted)
+        mailbox.mark_read()
+        if len(mailbox) >= COMPACT_AFTER:
+            mailbox.compact()
+        print()
+        input("\033[3mPress Enter to continue\033[0m")
+        return " "
+    return decrypt_legacy_message(me)
+
+
+def read_record(record, me):
+    """Plain text of a mailbox record addressed to ``me``."""
+    if record.session is None:
+        return rsa.decrypt_string(record.blocks, me.n, me.d, record.padding)
+    key = sessions.incoming(record.sender, record.session, record.blocks, me.n, me.d, record.padding)
+    if key is None:
+        return "[unknown session key]"
+    try:
+        return open_sealed(key, record.sealed)
+    except ValueError as error:
+        return "[{}]".format(error)
+
+
+def decrypt_legacy_message(me):
+    """Read a single-message ``<name>.txt`` file written by older versions."""
+    if os.path.isfile(me.name + ".txt"):
+        with open(me.name + ".txt", "r", encoding="utf-8") as f:
             sender = f.readline()
             receiver = f.readline()
             message = f.readline()
@@ -86,7 +122,7 @@ def decrypt_message():
     parts = message.split(" ")
     p = int(receiver.split(" ")[-1].split(")")[0])
     cipher = list(map(int, parts))
-    decrypted = rsa.decrypt_string(cipher, contactos['n0'], contactos['d0'], p)
+    decrypted = rsa.decrypt_string(cipher, me.n, me.d, p)
     print(sender, decrypted)
     print()
     input("\033[3mPress Enter to continue\033[0m")
@@ -95,22 +131,24 @@ def decrypt_message():
     
 def change_padding():
     print("######## Change padding ########")
-    contactos['p'] = int(input("New padding: "))
+    store.update_profile(padding=int(input("New padding: ")))
     return "Padding updated"
 
 
 def exit_program():
-    with open("contactos.json", "w", encoding="utf-8") as f:
-        json.dump(contactos, f)
+    # Every change is already committed; just release the database.
+    key_pool.close(wait=False)
+    store.close()
     return ""
 
     
 def main():
     os.system("cls")
-    print("########", contactos['0'], "########")
-    print("n =", contactos['n0'])
-    print("e =", contactos['e0'])
-    print("p =", contactos['p'])
+    me = store.profile()
+    print("########", me.name, "########")
+    print("n =", me.n)
+    print("e =", me.e)
+    print("p =", me.padding)
     print()
 
 if __name__ == "__main__":
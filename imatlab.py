@@ -1,29 +1,158 @@
+from __future__ import annotations
+
+import argparse
+import math
 import os
+import re
 import sys
+import time
+from collections import OrderedDict
 
 import modular
- 
+
+# asyncio, json and concurrent.futures are imported inside the batch/server
+# functions that need them, so a one-off command starts as fast as possible.
+
+# Lines per unit of work handed to a pool worker in --jobs mode.
+CHUNK_SIZE = 256
+
+# Default cost budget of each per-command memoization segment (see ResultCache).
+# The cache is opt-in: on batches with few repeats its bookkeeping costs more
+# than it saves, so it only runs with --cache-budget N (100_000 is a good N).
+CACHE_BUDGET = 0
+
+# Commands with side effects are never memoized.
+UNCACHED = {"run_commands"}
+
+# Commands cheap enough for --serve to answer on the event loop (a few Euclid
+# steps at most); every other command runs on the worker pool, since even
+# primo or pow can take seconds on large operands.
+LOOP_COMMANDS = {"mcd", "coprimos", "inv"}
+
+# Longest request line --serve accepts, in bytes; longer ones are skipped with
+# a "request too long" error.
+REQUEST_LIMIT = 16 * 2**20
+
+# Largest value the --plan bulk paths sieve up to; bigger inputs use the scalar path.
+SIEVE_LIMIT = 10**7
+
+# Largest value factored through a smallest-prime-factor table by --plan.
+SPF_LIMIT = 10**6
+
+# Grammar of an integer-only command line, as recognized by the --plan parser.
+_COMMAND_RE = re.compile(r"([A-Za-z_]\w*)\((-?[0-9]+(?:,-?[0-9]+)*)\)\s*")
+
 def clear_screen() -> None:
     """Clear the terminal screen."""
     os.system("cls" if os.name == "nt" else "clear")
 
 
+def parse_command(line: str):
+    """Split a command line into (operation, args).
+
+    ``args`` is the raw argument string for ``resolverSistema`` and a list of
+    ints for every other operation. Raises on malformed input.
+    """
+    command = line.split("(")
+    operation = command[0]
+    if operation == "resolverSistema":
+        return operation, command[1].split(")")[0]
+    raw = command[1].split(")")[0].split(",")
+    return operation, [int(i) for i in raw]
+
+
+def execute(operation: str, args):
+    """Run an already parsed command and return its result."""
+    if operation == "resolverSistema":
+        return dispatch(operation, [args])
+    return dispatch(operation, args)
+
+
+def run_line(line: str) -> str:
+    """Parse and run a single line, returning the text written for it."""
+    try:
+        return str(execute(*parse_command(line)))
+    except Exception:
+        return "ERROR"
+
+
 def run_commands(input_stream, output_stream) -> None:
     """Run commands from a text stream and write results to output_stream."""
     for line in input_stream:
+        output_stream.write(run_line(line) + "\n")
+
+
+def _run_chunk(parsed: list) -> tuple[list[str], dict, dict]:
+    """Worker side of :func:`run_commands_parallel`.
+
+    Returns the result lines plus the worker's cache counters and command
+    statistics for this chunk.
+    """
+    results = []
+    for command in parsed:
+        if command is None:
+            results.append("ERROR")
+            continue
         try:
-            command = line.split("(")
-            operation = command[0]
-            if operation == "resolverSistema":
-                raw_args = command[1].split(")")[0]
-                result = solve_system(raw_args)
-            else:
-                raw = command[1].split(")")[0].split(",")
-                args = [int(i) for i in raw]
-                result = dispatch(operation, args)
-            output_stream.write(str(result) + "\n")
+            results.append(str(execute(*command)))
         except Exception:
-            output_stream.write("ERROR\n")
+            results.append("ERROR")
+    return results, CACHE.take_stats(), STATS.take()
+
+
+def _init_worker(cache_budget: int, stats_enabled: bool, slow_threshold: float | None) -> None:
+    """Pool initializer: give each worker the parent's cache and stats settings."""
+    CACHE.budget = cache_budget
+    CACHE.enabled = cache_budget > 0
+    STATS.enabled = stats_enabled
+    STATS.slow_threshold = slow_threshold
+
+
+def _worker_settings() -> tuple:
+    return CACHE.budget, STATS.enabled, STATS.slow_threshold
+
+
+def run_commands_parallel(input_stream, output_stream, jobs: int, chunk_size: int = CHUNK_SIZE) -> None:
+    """Like :func:`run_commands`, but spread over a pool of ``jobs`` processes.
+
+    The whole stream is parsed up front and sent to the workers in chunks of
+    ``chunk_size`` lines. Finished chunks wait in a reorder buffer until every
+    chunk before them has been written, so output keeps the input line order
+    and is streamed as soon as each prefix is complete.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    parsed = []
+    for line in input_stream:
+        try:
+            parsed.append(parse_command(line))
+        except Exception:
+            parsed.append(None)
+
+    chunks = [parsed[i : i + chunk_size] for i in range(0, len(parsed), chunk_size)]
+    max_in_flight = jobs * 4
+    pending = {}
+    ready = {}
+    next_submit = 0
+    next_write = 0
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=_worker_settings()) as pool:
+        while next_write < len(chunks):
+            while next_submit < len(chunks) and len(pending) < max_in_flight:
+                pending[pool.submit(_run_chunk, chunks[next_submit])] = next_submit
+                next_submit += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, cache_stats, command_stats = future.result()
+                ready[pending.pop(future)] = results
+                CACHE.merge_stats(cache_stats)
+                STATS.merge(command_stats)
+
+            while next_write in ready:
+                output_stream.write("".join(r + "\n" for r in ready.pop(next_write)))
+                next_write += 1
+            output_stream.flush()
 
 
 def solve_system(args: str):
@@ -38,16 +167,780 @@ def solve_system(args: str):
     return modular.solve_congruence_system(a_list, b_list, p_list)
 
 
+def _merge_cache_stats(into: dict, stats: dict) -> None:
+    """Add the hit/miss counters in ``stats`` to ``into``."""
+    for operation, (hits, misses) in stats.items():
+        counters = into.setdefault(operation, [0, 0])
+        counters[0] += hits
+        counters[1] += misses
+
+
+def _result_cost(result) -> int:
+    """Rough memory cost of a cached result, in list/dict entries."""
+    if isinstance(result, (list, tuple, dict, set)):
+        return max(1, len(result))
+    return 1
+
+
+class ResultCache:
+    """LRU memo of command results keyed by (operation, args).
+
+    Every operation gets its own LRU segment with a cost budget, so a single
+    huge ``primos`` result can only evict other ``primos`` entries, never the
+    thousands of cheap ``mcd`` results. Results costing more than a whole
+    segment are not stored at all.
+    """
+
+    def __init__(self, budget: int = CACHE_BUDGET) -> None:
+        self.budget = budget
+        self.enabled = budget > 0
+        self._segments: dict[str, OrderedDict] = {}
+        self._costs: dict[str, int] = {}
+        self.stats: dict[str, list[int]] = {}
+
+    def lookup(self, operation: str, args: tuple):
+        """Return (hit, value) for a cached call."""
+        counters = self.stats.get(operation)
+        if counters is None:
+            counters = self.stats[operation] = [0, 0]
+        segment = self._segments.get(operation)
+        entry = segment.get(args) if segment is not None else None
+        if entry is not None:
+            segment.move_to_end(args)
+            counters[0] += 1
+            return True, entry[0]
+        counters[1] += 1
+        return False, None
+
+    def store(self, operation: str, args: tuple, result) -> None:
+        cost = _result_cost(result)
+        if cost > self.budget:
+            return
+        segment = self._segments.setdefault(operation, OrderedDict())
+        used = self._costs.get(operation, 0)
+        while segment and used + cost > self.budget:
+            _key, (_value, old_cost) = segment.popitem(last=False)
+            used -= old_cost
+        segment[args] = (result, cost)
+        self._costs[operation] = used + cost
+
+    def clear(self) -> None:
+        self._segments.clear()
+        self._costs.clear()
+
+    def take_stats(self) -> dict:
+        """Return the hit/miss counters and reset them."""
+        stats, self.stats = self.stats, {}
+        return stats
+
+    def merge_stats(self, stats: dict) -> None:
+        _merge_cache_stats(self.stats, stats)
+
+    def report(self) -> str:
+        """Per-operation hit rates as printable text."""
+        lines = ["cache hits:"]
+        total_hits = total_calls = 0
+        for operation, (hits, misses) in sorted(self.stats.items()):
+            calls = hits + misses
+            total_hits += hits
+            total_calls += calls
+            lines.append(f"  {operation:<16}{hits:>10}/{calls:<10}{hits / calls:>8.1%}")
+        if total_calls:
+            lines.append(f"  {'total':<16}{total_hits:>10}/{total_calls:<10}{total_hits / total_calls:>8.1%}")
+        return "\n".join(lines)
+
+
+CACHE = ResultCache()
+
+
+def format_command(operation: str, args: list) -> str:
+    """Turn a parsed command back into an input line (without newline)."""
+    return f"{operation}({','.join(str(a) for a in args)})"
+
+
+def _bit_bucket(args: list) -> int:
+    """Smallest power-of-two bit width (at least 8) holding every int argument."""
+    bits = max((abs(a).bit_length() for a in args if isinstance(a, int)), default=0)
+    bucket = 8
+    while bucket < bits:
+        bucket *= 2
+    return bucket
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CommandStats:
+    """Per-operation call/error counts, latencies and input bit sizes.
+
+    Disabled by default; when ``enabled`` every :func:`dispatch` call is timed.
+    Calls taking at least ``slow_threshold`` seconds are kept as input lines
+    in ``slow`` so they can be replayed by ``imatlab_benchmark.py --replay``.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.slow_threshold: float | None = None
+        self.slow: list[str] = []
+        self._ops: dict[str, dict] = {}
+
+    def _entry(self, operation: str) -> dict:
+        entry = self._ops.get(operation)
+        if entry is None:
+            entry = {"calls": 0, "errors": 0, "latencies": [], "bits": {}}
+            self._ops[operation] = entry
+        return entry
+
+    def record(self, operation: str, args: list, elapsed: float, failed: bool) -> None:
+        entry = self._entry(operation)
+        entry["calls"] += 1
+        entry["errors"] += failed
+        entry["latencies"].append(elapsed)
+        bucket = _bit_bucket(args)
+        entry["bits"][bucket] = entry["bits"].get(bucket, 0) + 1
+        if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+            self.slow.append(format_command(operation, args))
+
+    def take(self) -> dict:
+        """Return the raw counters and reset them (used to ship them between processes)."""
+        taken = {"ops": self._ops, "slow": self.slow}
+        self._ops, self.slow = {}, []
+        return taken
+
+    def merge(self, taken: dict) -> None:
+        for operation, other in taken["ops"].items():
+            entry = self._entry(operation)
+            entry["calls"] += other["calls"]
+            entry["errors"] += other["errors"]
+            entry["latencies"].extend(other["latencies"])
+            for bucket, count in other["bits"].items():
+                entry["bits"][bucket] = entry["bits"].get(bucket, 0) + count
+        self.slow.extend(taken["slow"])
+
+    def summary(self) -> dict:
+        """Per-operation summary: calls, errors, total/p50/p99/max seconds, bit buckets."""
+        result = {}
+        for operation, entry in sorted(self._ops.items()):
+            ordered = sorted(entry["latencies"])
+            result[operation] = {
+                "calls": entry["calls"],
+                "errors": entry["errors"],
+                "total_s": sum(ordered),
+                "p50_s": _percentile(ordered, 0.50),
+                "p99_s": _percentile(ordered, 0.99),
+                "max_s": ordered[-1],
+                "bits": dict(sorted(entry["bits"].items())),
+            }
+        return result
+
+    def report(self) -> str:
+        """Printable per-operation latency table."""
+        lines = [
+            f"{'command':<16}{'calls':>9}{'errors':>8}{'total ms':>12}{'p50 us':>10}{'p99 us':>10}{'max us':>11}  bits"
+        ]
+        for operation, row in self.summary().items():
+            bits = " ".join(f"<={bucket}:{count}" for bucket, count in row["bits"].items())
+            lines.append(
+                f"{operation:<16}{row['calls']:>9}{row['errors']:>8}{row['total_s'] * 1e3:>12.2f}"
+                f"{row['p50_s'] * 1e6:>10.1f}{row['p99_s'] * 1e6:>10.1f}{row['max_s'] * 1e6:>11.1f}  {bits}"
+            )
+        return "\n".join(lines)
+
+
+STATS = CommandStats()
+
+
 def dispatch(operation: str, args: list[int]):
-    """Dispatch a parsed operation name to a known function."""
-    if operation in COMMANDS:
+    """Dispatch a parsed operation name to a known function.
+
+    Calls are timed into :data:`STATS` when it is enabled.
+    """
+    if operation not in COMMANDS:
+        return "Error: Invalid command"
+    if not STATS.enabled:
+        return _call(operation, args)
+
+    start = time.perf_counter()
+    try:
+        result = _call(operation, args)
+    except Exception:
+        STATS.record(operation, args, time.perf_counter() - start, True)
+        raise
+    STATS.record(operation, args, time.perf_counter() - start, False)
+    return result
+
+
+def _call(operation: str, args: list):
+    """Call a known command, memoized in :data:`CACHE` unless listed in :data:`UNCACHED`."""
+    if not CACHE.enabled or operation in UNCACHED:
         return COMMANDS[operation](*args)
-    return "Error: Invalid command"
+
+    key = tuple(args)
+    hit, result = CACHE.lookup(operation, key)
+    if not hit:
+        result = COMMANDS[operation](*args)
+        CACHE.store(operation, key, result)
+    return result
  
  
+def _isolated_worker(conn, memory_mb: int | None, cpu_seconds: float | None, settings: tuple) -> None:
+    """Body of an :class:`IsolatedWorker` process: run commands received on ``conn``."""
+    _init_worker(*settings)
+    # Timings are taken by the parent, which also sees timeouts.
+    STATS.enabled = False
+
+    resource = None
+    if os.name != "nt":
+        import resource
+        if memory_mb is not None:
+            _soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 2**20, hard))
+
+    while True:
+        try:
+            command = conn.recv()
+        except EOFError:
+            return
+        if resource is not None and cpu_seconds is not None:
+            # RLIMIT_CPU counts the whole process lifetime, so move the limit
+            # forward before each command. It backs up the parent's wall clock.
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            limit = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+            _soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+        try:
+            reply = str(execute(*command))
+        except MemoryError:
+            reply = "OOM"
+        except Exception:
+            reply = "ERROR"
+        conn.send((reply, CACHE.take_stats()))
+
+
+class IsolatedWorker:
+    """A recyclable child process that runs one command at a time under limits.
+
+    ``timeout`` bounds each command in seconds of wall-clock time (with a CPU
+    time rlimit as backstop) and ``memory_mb`` caps the worker's address space.
+    A worker that overruns is killed and transparently replaced; the command
+    then yields ``TIMEOUT`` or ``OOM`` instead of a result. Limits other than
+    the wall clock are only applied on POSIX systems.
+
+    Cache hit/miss counters reported by the child accumulate in
+    ``cache_stats`` and survive recycling.
+    """
+
+    def __init__(self, timeout: float | None = None, memory_mb: int | None = None) -> None:
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.cache_stats: dict[str, list[int]] = {}
+        self._process = None
+        self._conn = None
+
+    def _start(self) -> None:
+        import multiprocessing
+
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_isolated_worker,
+            args=(child_conn, self.memory_mb, self.timeout, _worker_settings()),
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+
+    def _recycle(self) -> None:
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._process = self._conn = None
+
+    def run(self, command: tuple) -> str:
+        """Run a parsed command and return its output line (without newline)."""
+        if self._process is None:
+            self._start()
+        self._conn.send(command)
+        if not self._conn.poll(self.timeout):
+            self._recycle()
+            return "TIMEOUT"
+        try:
+            reply, cache_stats = self._conn.recv()
+        except EOFError:
+            import signal
+
+            exitcode = self._process.exitcode
+            self._recycle()
+            if exitcode == -getattr(signal, "SIGXCPU", 0):
+                return "TIMEOUT"
+            return "OOM" if self.memory_mb is not None else "ERROR"
+        _merge_cache_stats(self.cache_stats, cache_stats)
+        if reply == "OOM":
+            # Whatever was allocated before the MemoryError may still be held.
+            self._recycle()
+        return reply
+
+    def close(self) -> None:
+        if self._process is not None:
+            self._conn.close()
+            self._process.join(1)
+            if self._process.is_alive():
+                self._process.kill()
+            self._process = self._conn = None
+
+
+def run_commands_isolated(
+    input_stream,
+    output_stream,
+    jobs: int = 1,
+    timeout: float | None = None,
+    memory_mb: int | None = None,
+) -> None:
+    """Like :func:`run_commands`, but every command runs in an :class:`IsolatedWorker`.
+
+    ``jobs`` workers run commands concurrently; output keeps the input order
+    and is written as soon as each prefix is complete. Commands exceeding
+    ``timeout`` seconds or ``memory_mb`` megabytes produce ``TIMEOUT`` /
+    ``OOM`` lines, so one runaway command cannot stall the whole batch.
+    """
+    import queue
+    from concurrent.futures import ThreadPoolExecutor
+
+    workers = [IsolatedWorker(timeout, memory_mb) for _ in range(jobs)]
+    idle = queue.SimpleQueue()
+    for worker in workers:
+        idle.put(worker)
+
+    def run(line: str) -> str:
+        try:
+            command = parse_command(line)
+        except Exception:
+            return "ERROR"
+        worker = idle.get()
+        start = time.perf_counter()
+        try:
+            reply = worker.run(command)
+        finally:
+            idle.put(worker)
+        if STATS.enabled:
+            operation, args = command
+            args = [args] if operation == "resolverSistema" else args
+            failed = reply in ("ERROR", "TIMEOUT", "OOM")
+            STATS.record(operation, args, time.perf_counter() - start, failed)
+        return reply
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for reply in pool.map(run, input_stream):
+                output_stream.write(reply + "\n")
+    finally:
+        for worker in workers:
+            worker.close()
+            CACHE.merge_stats(worker.cache_stats)
+
+
+def plan_commands(lines: list[str]) -> dict[str, tuple[list[int], list[tuple]]]:
+    """Parse a whole batch into per-operation columns.
+
+    Returns ``{operation: (line_numbers, arg_tuples)}``. Lines that do not
+    match the integer grammar (``resolverSistema``, malformed input, ...)
+    are left out and later run through :func:`run_line`.
+    """
+    groups: dict[str, tuple[list[int], list[tuple]]] = {}
+    match = _COMMAND_RE.fullmatch
+    for index, line in enumerate(lines):
+        found = match(line)
+        if found is None:
+            continue
+        operation, raw = found.groups()
+        group = groups.get(operation)
+        if group is None:
+            group = groups[operation] = ([], [])
+        group[0].append(index)
+        group[1].append(tuple(map(int, raw.split(","))))
+    return groups
+
+
+def _sieve(end: int) -> bytearray:
+    """Primality flags for [0, end)."""
+    flags = bytearray([1]) * max(end, 2)
+    flags[0] = flags[1] = 0
+    for p in range(2, math.isqrt(end - 1) + 1 if end > 1 else 0):
+        if flags[p]:
+            flags[p * p :: p] = bytes(len(range(p * p, end, p)))
+    return flags
+
+
+def _spf_table(end: int) -> list[int]:
+    """Smallest prime factor of every n in [0, end)."""
+    spf = list(range(end))
+    for p in range(2, math.isqrt(end - 1) + 1 if end > 1 else 0):
+        if spf[p] == p:
+            for multiple in range(p * p, end, p):
+                if spf[multiple] == multiple:
+                    spf[multiple] = p
+    return spf
+
+
+def _spf_factorize(n: int, spf: list[int]) -> dict[int, int]:
+    factors: dict[int, int] = {}
+    while n > 1:
+        p = spf[n]
+        factors[p] = factors.get(p, 0) + 1
+        n //= p
+    return factors
+
+
+def _small_rows_top(rows, arity: int, position: int, limit: int) -> int:
+    """Largest ``row[position]`` below ``limit`` among rows of the right arity."""
+    return max((row[position] for row in rows if len(row) == arity and row[position] < limit), default=0)
+
+
+def _bulk_mcd(rows):
+    return [str(math.gcd(*row)) if len(row) == 2 else None for row in rows]
+
+
+def _bulk_coprimos(rows):
+    return [str(math.gcd(*row) == 1) if len(row) == 2 else None for row in rows]
+
+
+def _bulk_pow(rows):
+    # Mirrors modular.mod_pow; negative exponents take the scalar path.
+    out = []
+    for row in rows:
+        if len(row) != 3 or row[1] < 0:
+            out.append(None)
+        elif row[2] == 0:
+            out.append("ERROR")
+        else:
+            base, exponent, modulus = row
+            out.append(str(pow(base % modulus, exponent, modulus)))
+    return out
+
+
+def _bulk_inv(rows):
+    # Matches modular.mod_inverse for value >= 0 and modulus >= 1.
+    out = []
+    for row in rows:
+        if len(row) != 2 or row[0] < 0 or row[1] < 1:
+            out.append(None)
+            continue
+        try:
+            out.append(str(pow(row[0], -1, row[1])))
+        except ValueError:
+            out.append("None")
+    return out
+
+
+def _bulk_primo(rows):
+    flags = _sieve(_small_rows_top(rows, 1, 0, SIEVE_LIMIT) + 1)
+    out = []
+    for row in rows:
+        if len(row) != 1 or row[0] >= SIEVE_LIMIT:
+            out.append(None)
+        else:
+            out.append(str(row[0] >= 0 and flags[row[0]] == 1))
+    return out
+
+
+def _bulk_primos(rows):
+    flags = _sieve(_small_rows_top(rows, 2, 1, SIEVE_LIMIT + 1))
+    out = []
+    for row in rows:
+        if len(row) != 2 or row[1] > SIEVE_LIMIT:
+            out.append(None)
+            continue
+        start, end = row
+        out.append(str([v for v in range(max(2, start), end) if flags[v]] if end > 2 else []))
+    return out
+
+
+def _bulk_factorizar(rows):
+    spf = _spf_table(_small_rows_top(rows, 1, 0, SPF_LIMIT) + 1)
+    out = []
+    for row in rows:
+        if len(row) != 1 or row[0] >= SPF_LIMIT:
+            out.append(None)
+        else:
+            out.append(str(_spf_factorize(row[0], spf)))
+    return out
+
+
+def _bulk_euler(rows):
+    spf = _spf_table(_small_rows_top(rows, 1, 0, SPF_LIMIT) + 1)
+    out = []
+    for row in rows:
+        if len(row) != 1 or row[0] >= SPF_LIMIT:
+            out.append(None)
+        elif row[0] <= 0:
+            out.append("ERROR")
+        else:
+            n = result = row[0]
+            for p in _spf_factorize(n, spf):
+                result = result // p * (p - 1)
+            out.append(str(result))
+    return out
+
+
+# Operation -> bulk implementation used by --plan. Each one takes the
+# argument tuples of a group and returns one output line per row, or None
+# for rows it leaves to the scalar path.
+BULK_COMMANDS = {
+    "mcd": _bulk_mcd,
+    "coprimos": _bulk_coprimos,
+    "pow": _bulk_pow,
+    "inv": _bulk_inv,
+    "primo": _bulk_primo,
+    "primos": _bulk_primos,
+    "factorizar": _bulk_factorizar,
+    "euler": _bulk_euler,
+}
+
+
+def run_commands_planned(input_stream, output_stream) -> None:
+    """Like :func:`run_commands`, but grouped by operation.
+
+    The batch is parsed into columns by :func:`plan_commands`, each group
+    with an entry in :data:`BULK_COMMANDS` is solved in one go (sharing
+    sieves and skipping per-line dispatch), and results are scattered back
+    into input order. Everything else falls back to :func:`run_line`.
+    Bulk rows bypass :data:`CACHE`; in :data:`STATS` each row of a bulk
+    group is recorded with the group's time divided by its row count.
+    """
+    lines = list(input_stream)
+    output: list[str | None] = [None] * len(lines)
+
+    for operation, (indices, rows) in plan_commands(lines).items():
+        bulk = BULK_COMMANDS.get(operation)
+        if bulk is None:
+            continue
+        start = time.perf_counter()
+        for index, text in zip(indices, bulk(rows)):
+            output[index] = text
+        if STATS.enabled:
+            # Rows left as None are timed by dispatch() on the fallback path.
+            solved = [(row, output[index]) for row, index in zip(rows, indices) if output[index] is not None]
+            per_row = (time.perf_counter() - start) / max(1, len(solved))
+            for row, text in solved:
+                STATS.record(operation, list(row), per_row, text == "ERROR")
+
+    for index, text in enumerate(output):
+        if text is None:
+            output[index] = run_line(lines[index])
+    output_stream.write("".join(text + "\n" for text in output))
+
+
+def run_file(
+    in_path: str,
+    out_path: str,
+    jobs: int,
+    timeout: float | None = None,
+    memory_mb: int | None = None,
+    plan: bool = False,
+) -> None:
+    """Run a command file sequentially, on a process pool, or in isolated workers.
+
+    Isolated workers are used whenever a ``timeout`` or ``memory_mb`` limit is
+    given; otherwise ``plan`` selects the grouped :func:`run_commands_planned`.
+    """
+    with open(in_path, "r", encoding="utf-8") as fin:
+        with open(out_path, "w", encoding="utf-8") as fout:
+            if timeout is not None or memory_mb is not None:
+                run_commands_isolated(fin, fout, jobs, timeout, memory_mb)
+            elif plan:
+                run_commands_planned(fin, fout)
+            elif jobs > 1:
+                run_commands_parallel(fin, fout, jobs)
+            else:
+                run_commands(fin, fout)
+    if CACHE.enabled and CACHE.stats:
+        print(CACHE.report(), file=sys.stderr)
+    if STATS.enabled:
+        print(STATS.report(), file=sys.stderr)
+
+
+async def _handle_request(raw: str, pool) -> str:
+    """Answer one JSON-lines request of the form {"id": ..., "command": "mcd(4,6)"}.
+
+    The reply carries the same id and the text :func:`run_commands` would
+    have written for the command, so clients can match out-of-order replies.
+    """
+    import asyncio
+    import json
+
+    try:
+        request = json.loads(raw)
+    except ValueError:
+        request = None
+    if not isinstance(request, dict) or "command" not in request:
+        request_id = request.get("id") if isinstance(request, dict) else None
+        return json.dumps({"id": request_id, "error": "invalid request"})
+    line = str(request["command"])
+
+    if line.split("(")[0].strip() in LOOP_COMMANDS:
+        result = run_line(line)
+    else:
+        result = await asyncio.get_running_loop().run_in_executor(pool, run_line, line)
+    return json.dumps({"id": request.get("id"), "result": result})
+
+
+async def _read_request(reader: asyncio.StreamReader) -> bytes | None:
+    """Next line from ``reader`` (b"" at EOF), or None if it exceeded the reader's limit.
+
+    An over-long line is consumed and discarded piece by piece, so it never
+    has to fit in memory and the following line is read normally.
+    """
+    import asyncio
+
+    too_long = False
+    while True:
+        try:
+            line = await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as exc:
+            line = exc.partial
+        except asyncio.LimitOverrunError as exc:
+            await reader.readexactly(exc.consumed)
+            too_long = True
+            continue
+        return None if too_long else line
+
+
+async def _serve_stream(readline, write, pool) -> None:
+    """Serve requests read with ``readline`` concurrently, writing replies as they finish.
+
+    ``readline`` returns None for a line that was too long to accept.
+    """
+    import asyncio
+    import json
+
+    tasks = set()
+
+    async def answer(raw: str) -> None:
+        write(await _handle_request(raw, pool) + "\n")
+
+    while True:
+        raw = await readline()
+        if raw is None:
+            write(json.dumps({"id": None, "error": "request too long"}) + "\n")
+            continue
+        if not raw:
+            break
+        if not raw.strip():
+            continue
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        task = asyncio.create_task(answer(raw))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+def _read_stdin_request() -> str | None:
+    """Blocking counterpart of :func:`_read_request` for stdin read in a thread."""
+    line = sys.stdin.readline(REQUEST_LIMIT + 1)
+    if len(line) <= REQUEST_LIMIT or line.endswith("\n"):
+        return line
+    while line and not line.endswith("\n"):
+        line = sys.stdin.readline(REQUEST_LIMIT)
+    return None
+
+
+async def serve(socket_path: str | None, jobs: int) -> None:
+    """Keep one warm interpreter answering JSON-lines requests.
+
+    Requests come from stdin, or from any number of concurrent clients on the
+    Unix domain socket ``socket_path``. Only :data:`LOOP_COMMANDS` run on the
+    event loop; the rest go to a pool of ``jobs`` processes so cheap queries
+    never queue behind them.
+    """
+    import asyncio
+    import stat
+    from concurrent.futures import ProcessPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=_worker_settings()) as pool:
+        if socket_path is None:
+            mode = os.fstat(sys.stdin.fileno()).st_mode
+            if stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or sys.stdin.isatty():
+                reader = asyncio.StreamReader(limit=REQUEST_LIMIT)
+                await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+                def readline():
+                    return _read_request(reader)
+            else:
+                # Regular files and devices such as /dev/null cannot be
+                # watched by the event loop (stdin redirected with "<"), so
+                # they are read in a thread.
+                def readline():
+                    return loop.run_in_executor(None, _read_stdin_request)
+
+            def write(text: str) -> None:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+
+            await _serve_stream(readline, write, pool)
+            return
+
+        async def client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                await _serve_stream(
+                    lambda: _read_request(reader), lambda text: writer.write(text.encode("utf-8")), pool
+                )
+                await writer.drain()
+            finally:
+                writer.close()
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(client, path=socket_path, limit=REQUEST_LIMIT)
+        async with server:
+            await server.serve_forever()
+
+
 def main() -> None:
     """Entry point for interactive mode or batch mode."""
-    if len(sys.argv) == 1:
+    parser = argparse.ArgumentParser(description="IMAT-LAB command interpreter")
+    parser.add_argument("files", nargs="*", help="input file and optional output file")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="worker processes for batch mode")
+    parser.add_argument("--serve", action="store_true", help="answer JSON-lines requests until EOF")
+    parser.add_argument("--socket", help="with --serve, listen on this Unix domain socket instead of stdin")
+    parser.add_argument("--cache-budget", type=int, default=CACHE_BUDGET,
+                        help="enable the result cache with this cost budget per command "
+                             "(default 0: off; try 100000 for batches with many repeats)")
+    parser.add_argument("--timeout", type=float, help="per-command time limit in seconds (prints TIMEOUT)")
+    parser.add_argument("--memory-mb", type=int, help="per-worker memory limit in MB (prints OOM)")
+    parser.add_argument("--plan", action="store_true",
+                        help="group same-operation commands and solve them in bulk (single process; "
+                             "bulk groups skip the result cache)")
+    parser.add_argument("--stats", action="store_true",
+                        help="print per-command latency statistics after a batch (with --plan, bulk "
+                             "rows get their group's average time)")
+    parser.add_argument("--slow-ms", type=float, help="with --stats, collect commands slower than this")
+    parser.add_argument("--slow-log", default="slow_commands.txt", help="file receiving the slow commands")
+    parser.add_argument("--prime-table", metavar="FILE",
+                        help="memory-mapped prime table shared by all workers (built on first use)")
+    options = parser.parse_args()
+    if options.plan and options.jobs > 1:
+        parser.error("--plan runs in a single process and cannot be combined with --jobs")
+    if options.plan and (options.timeout is not None or options.memory_mb is not None):
+        parser.error("--plan cannot be combined with --timeout or --memory-mb")
+
+    CACHE.budget = options.cache_budget
+    CACHE.enabled = options.cache_budget > 0
+    STATS.enabled = options.stats
+    if options.slow_ms is not None:
+        STATS.slow_threshold = options.slow_ms / 1000
+    if options.prime_table:
+        modular.use_prime_table(options.prime_table)
+
+    if options.serve:
+        import asyncio
+
+        asyncio.run(serve(options.socket, options.jobs))
+    elif len(options.files) == 0:
+        clear_screen()
         print("Interactive CLI")
         print("    - exit     - help     - clear")
 
@@ -67,34 +960,28 @@ def main() -> None:
                 continue
             else:
                 try:
-                    parts = raw_command.split("(")
-                    operation = parts[0]
-                    if operation == "resolverSistema":
-                        raw_args = parts[1].split(")")[0]
-                        result = solve_system(raw_args)
-                    else:
-                        raw = parts[1].split(")")[0].split(",")
-                        args = [int(i) for i in raw]
-                        result = dispatch(operation, args)
-                    print(result)
+                    print(execute(*parse_command(raw_command)))
                 except Exception:
                     print("Error: Invalid command")
-    elif len(sys.argv) == 2:
-        with open(sys.argv[1], "r", encoding="utf-8") as fin:
-            with open(sys.argv[1].split(".")[0] + "Output.txt", "w", encoding="utf-8") as fout:
-                run_commands(fin, fout)
-    elif len(sys.argv) == 3:
-        with open(sys.argv[1], "r", encoding="utf-8") as fin:
-            with open(sys.argv[2], "w", encoding="utf-8") as fout:
-                run_commands(fin, fout)
+    elif len(options.files) == 1:
+        out_path = options.files[0].split(".")[0] + "Output.txt"
+        run_file(options.files[0], out_path, options.jobs, options.timeout, options.memory_mb, options.plan)
+    elif len(options.files) == 2:
+        run_file(options.files[0], options.files[1], options.jobs, options.timeout, options.memory_mb, options.plan)
     else:
         print("Error: Invalid number of arguments")
+
+    if STATS.slow:
+        with open(options.slow_log, "w", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in STATS.slow))
  
  
 COMMANDS = {
     "run_commands": run_commands,
     "primo": modular.is_prime,
     "primos": modular.list_primes,
+    "contarPrimos": modular.prime_count,
+    "enesimoPrimo": modular.nth_prime,
     "factorizar": modular.factorize,
     "mcd": modular.gcd,
     "coprimos": modular.are_coprime,
@@ -102,6 +989,7 @@ COMMANDS = {
     "inv": modular.mod_inverse,
     "euler": modular.euler_totient,
     "legendre": modular.legendre_symbol,
+    "logDiscreto": modular.discrete_log,
     "resolverSistema": solve_system,
     "raiz": modular.mod_sqrt,
     "ecCuadratica": modular.quadratic_equation_mod_p,
@@ -109,7 +997,6 @@ COMMANDS = {
  
 
 if __name__ == "__main__":
-    clear_screen()
     main()
 
 
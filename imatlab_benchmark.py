@@ -5,89 +5,343 @@ Matemática Discreta - IMAT
 ICAI, Universidad Pontificia Comillas
 
 Description:
-Script to measure execution times for the IMAT-LAB program.
+Workload benchmark suite for the IMAT-LAB program.
 
-Usage instructions:
-Edit the input/output file lists to run different benchmarks.
+For every imatlab command and every input-size tier it supports, a synthetic
+command file is generated in memory and run through ``imatlab.run_commands``.
+Each workload gets warmup runs followed by timed trials; the median, the
+interquartile range and the throughput (commands per second) are reported.
 
-The main loop contains code to run benchmarking and/or profiling using each of the
-provided input files. Comment out whichever part you don't need.
+Usage:
+    python imatlab_benchmark.py                           # run everything
+    python imatlab_benchmark.py -c mcd -c pow -t small    # subset
+    python imatlab_benchmark.py --output bench.json       # save results
+    python imatlab_benchmark.py --baseline bench.json     # flag regressions
+    python imatlab_benchmark.py --profile profiles/       # cProfile dumps
+    python imatlab_benchmark.py --replay slow_commands.txt  # commands logged by imatlab --slow-ms
+
+Exits with status 1 when a workload is slower than the baseline by more than
+the regression threshold.
 """
 
-import timeit
+from __future__ import annotations
+
+import argparse
 import cProfile
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
 import imatlab
+import modular
+
+# Input-size tiers: (lower, upper) bounds for the generated operands.
+TIERS: Dict[str, tuple] = {
+    "small": (2, 10**4),
+    "word": (2**16, 2**32),
+    "digits20": (10**19, 10**20),
+    "digits40": (10**39, 10**40),
+}
+
+# Commands per generated workload.
+WORKLOAD_SIZE = 200
+
+# Untimed runs before the measured trials.
+WARMUP = 2
+
+# Timed trials per workload.
+TRIALS = 10
+
+# Relative slowdown of the median over the baseline reported as a regression.
+REGRESSION_THRESHOLD = 0.10
+
+# Seed used for workload generation, so runs are comparable.
+SEED = 1234
+
+
+def _random_prime(rng: random.Random, lower: int, upper: int) -> int:
+    """Random prime in [lower, upper) (trial division, so only for small tiers)."""
+    while True:
+        candidate = rng.randrange(lower, upper) | 1
+        if modular.is_prime(candidate):
+            return candidate
+
+
+def _gen_primo(rng, lower, upper):
+    return f"primo({rng.randrange(lower, upper)})"
+
+
+def _gen_primos(rng, lower, upper):
+    start = rng.randrange(lower, upper)
+    return f"primos({start},{start + 1000})"
+
+
+def _gen_contar_primos(rng, lower, upper):
+    return f"contarPrimos({rng.randrange(lower, upper)})"
+
+
+def _gen_enesimo_primo(rng, lower, upper):
+    return f"enesimoPrimo({rng.randrange(max(1, lower), upper)})"
+
+
+def _gen_factorizar(rng, lower, upper):
+    return f"factorizar({rng.randrange(lower, upper)})"
+
+
+def _gen_mcd(rng, lower, upper):
+    return f"mcd({rng.randrange(lower, upper)},{rng.randrange(lower, upper)})"
+
+
+def _gen_coprimos(rng, lower, upper):
+    return f"coprimos({rng.randrange(lower, upper)},{rng.randrange(lower, upper)})"
+
+
+def _gen_pow(rng, lower, upper):
+    return f"pow({rng.randrange(lower, upper)},{rng.randrange(lower, upper)},{rng.randrange(lower, upper)})"
+
+
+def _gen_inv(rng, lower, upper):
+    return f"inv({rng.randrange(lower, upper)},{rng.randrange(lower, upper)})"
+
+
+def _gen_euler(rng, lower, upper):
+    return f"euler({rng.randrange(lower, upper)})"
+
+
+def _gen_legendre(rng, lower, upper):
+    p = _random_prime(rng, max(3, lower), upper)
+    return f"legendre({rng.randrange(1, p)},{p})"
+
+
+def _gen_log_discreto(rng, lower, upper):
+    p = _random_prime(rng, max(3, lower), upper)
+    g = rng.randrange(2, p)
+    return f"logDiscreto({g},{pow(g, rng.randrange(0, p - 1), p)},{p})"
+
+
+def _gen_resolver_sistema(rng, lower, upper):
+    moduli: List[int] = []
+    while len(moduli) < 3:
+        p = _random_prime(rng, max(3, lower), upper)
+        if p not in moduli:
+            moduli.append(p)
+    rows = ";".join(f"{rng.randrange(1, p)},{rng.randrange(0, p)},{p}" for p in moduli)
+    return f"resolverSistema([{rows}])"
+
+
+def _gen_raiz(rng, lower, upper):
+    p = _random_prime(rng, max(3, lower), upper)
+    return f"raiz({rng.randrange(1, p)},{p})"
+
+
+def _gen_ec_cuadratica(rng, lower, upper):
+    p = _random_prime(rng, max(3, lower), upper)
+    return f"ecCuadratica({rng.randrange(1, p)},{rng.randrange(0, p)},{rng.randrange(0, p)},{p})"
+
+
+# Command -> (line generator, tiers it can run in reasonable time).
+# factorizar/euler stop at "small": Pollard rho on word-sized primes takes
+# seconds per command, which would dominate the whole suite. The same goes
+# for contarPrimos, whose cost grows as x^(3/4).
+GENERATORS: Dict[str, tuple] = {
+    "primo": (_gen_primo, ("small", "word")),
+    "primos": (_gen_primos, ("small",)),
+    "contarPrimos": (_gen_contar_primos, ("small",)),
+    "enesimoPrimo": (_gen_enesimo_primo, ("small",)),
+    "factorizar": (_gen_factorizar, ("small",)),
+    "mcd": (_gen_mcd, ("small", "word", "digits20", "digits40")),
+    "coprimos": (_gen_coprimos, ("small", "word", "digits20", "digits40")),
+    "pow": (_gen_pow, ("small", "word", "digits20", "digits40")),
+    "inv": (_gen_inv, ("small", "word", "digits20", "digits40")),
+    "euler": (_gen_euler, ("small",)),
+    "legendre": (_gen_legendre, ("small", "word")),
+    "logDiscreto": (_gen_log_discreto, ("small", "word")),
+    "resolverSistema": (_gen_resolver_sistema, ("small", "word")),
+    "raiz": (_gen_raiz, ("small",)),
+    "ecCuadratica": (_gen_ec_cuadratica, ("small",)),
+}
+
+
+def generate_workload(command: str, tier: str, size: int = WORKLOAD_SIZE, seed: int = SEED) -> str:
+    """Return a synthetic command file with ``size`` lines of ``command``."""
+    generator, _tiers = GENERATORS[command]
+    lower, upper = TIERS[tier]
+    rng = random.Random(f"{seed}/{command}/{tier}")
+    return "".join(generator(rng, lower, upper) + "\n" for _ in range(size))
+
+
+def run_workload(text: str) -> None:
+    """Run a workload through imatlab with in-memory streams."""
+    imatlab.CACHE.clear()
+    imatlab.run_commands(io.StringIO(text), io.StringIO())
+
+
+def time_workload(text: str, warmup: int = WARMUP, trials: int = TRIALS) -> List[float]:
+    """Warm up, then return the wall time of each timed trial in seconds."""
+    for _ in range(warmup):
+        run_workload(text)
+    samples = []
+    for _ in range(trials):
+        start = time.perf_counter()
+        run_workload(text)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples: List[float], size: int) -> Dict[str, float]:
+    """Median, interquartile range and throughput of a set of trials."""
+    median = statistics.median(samples)
+    if len(samples) >= 2:
+        q1, _q2, q3 = statistics.quantiles(samples, n=4)
+    else:
+        q1 = q3 = median
+    return {
+        "median_s": median,
+        "iqr_s": q3 - q1,
+        "min_s": min(samples),
+        "max_s": max(samples),
+        "throughput_per_s": size / median if median > 0 else float("inf"),
+        "trials": len(samples),
+        "commands": size,
+    }
+
+
+def profile_workload(text: str, path: str) -> None:
+    """Write a cProfile/pstats dump of one workload run to ``path``."""
+    profiler = cProfile.Profile()
+    profiler.runcall(run_workload, text)
+    profiler.dump_stats(path)
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Return the workloads whose median regressed beyond ``threshold``."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = current["median_s"] / previous["median_s"] if previous["median_s"] > 0 else 1.0
+        current["baseline_ratio"] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def _report_row(name: str, row: dict, report: Callable[[str], None]) -> None:
+    report(
+        f"{name:<26}{row['median_s'] * 1000:>10.3f} ms"
+        f"  IQR {row['iqr_s'] * 1000:>8.3f} ms"
+        f"  {row['throughput_per_s']:>12.1f} cmd/s"
+    )
+
+
+def run_replays(
+    paths: List[str],
+    warmup: int,
+    trials: int,
+    profile_dir: Optional[str] = None,
+    report: Callable[[str], None] = print,
+) -> Dict[str, dict]:
+    """Benchmark command files as they are, results keyed ``replay/<file name>``."""
+    results: Dict[str, dict] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        base = os.path.basename(path)
+        name = f"replay/{base}"
+        results[name] = summarize(time_workload(text, warmup, trials), text.count("\n"))
+        if profile_dir is not None:
+            profile_workload(text, os.path.join(profile_dir, f"replay_{base}.pstats"))
+        _report_row(name, results[name], report)
+    return results
+
+
+def run_suite(
+    commands: List[str],
+    tiers: List[str],
+    size: int,
+    warmup: int,
+    trials: int,
+    profile_dir: Optional[str] = None,
+    report: Callable[[str], None] = print,
+) -> Dict[str, dict]:
+    """Benchmark every (command, tier) pair and return results keyed ``cmd/tier``."""
+    results: Dict[str, dict] = {}
+    for command in commands:
+        for tier in GENERATORS[command][1]:
+            if tier not in tiers:
+                continue
+            name = f"{command}/{tier}"
+            text = generate_workload(command, tier, size)
+            results[name] = summarize(time_workload(text, warmup, trials), size)
+            if profile_dir is not None:
+                profile_workload(text, os.path.join(profile_dir, f"{command}_{tier}.pstats"))
+            _report_row(name, results[name], report)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-c", "--command", action="append", choices=sorted(GENERATORS), help="commands to run")
+    parser.add_argument("-t", "--tier", action="append", choices=list(TIERS), help="input-size tiers to run")
+    parser.add_argument("--size", type=int, default=WORKLOAD_SIZE, help="commands per workload")
+    parser.add_argument("--warmup", type=int, default=WARMUP, help="untimed runs per workload")
+    parser.add_argument("--trials", type=int, default=TRIALS, help="timed runs per workload")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative median slowdown reported as a regression")
+    parser.add_argument("--profile", metavar="DIR", help="write a pstats dump per workload into DIR")
+    parser.add_argument("--replay", action="append", default=[], metavar="FILE",
+                        help="benchmark an existing command file instead of the synthetic workloads")
+    options = parser.parse_args()
+
+    if options.profile:
+        os.makedirs(options.profile, exist_ok=True)
+
+    if options.replay:
+        results = run_replays(options.replay, options.warmup, options.trials, options.profile)
+    else:
+        results = run_suite(
+            options.command or list(GENERATORS),
+            options.tier or list(TIERS),
+            options.size,
+            options.warmup,
+            options.trials,
+            options.profile,
+        )
+
+    regressions: List[str] = []
+    if options.baseline:
+        with open(options.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, options.threshold)
+        for name in regressions:
+            print(f"REGRESSION {name}: {results[name]['baseline_ratio']:.2f}x baseline median")
 
-# Number of repetitions.
-# Increasing it reduces random noise, but increases total execution time.
-NITERS=100
-
-def testRun(in_file:str, out_file:str):
-    """Wrapper for timeit/profile.
-
-    Opens the provided files and executes their commands using the imatlab module.
-    
-    Args:
-        in_file: Nombre del fichero de entrada.
-        out_file: Nombre del fichero de salida.
-    
-    Returns: Void
-    Raises:
-        IOError: Alguno de los ficheros no existe.
-    """
-    with open(in_file,"r") as fin:
-        with open(out_file,"w",encoding="utf-8") as fout:
-            imatlab.run_commands(fin,fout)
-
-def measureTime(in_file:str,out_file:str)->float:
-    """Measure average runtime of imatlab using the provided files.
-
-    Args:
-        in_file: Nombre del fichero de entrada.
-        out_file: Nombre del fichero de salida.
-    
-    Returns:
-        float: Tiempo de ejecución medio medido
-    Raises:
-        IOError: Alguno de los ficheros no existe.
-    """
-    t=timeit.Timer("testRun('"+in_file+"','"+out_file+"')","from __main__ import testRun")
-    return(t.timeit(number=NITERS)/NITERS)
-
-def profile(in_file,out_file):
-    """Print a profile of imatlab execution for the provided files.
-
-    Args:
-        in_file: Nombre del fichero de entrada.
-        out_file: Nombre del fichero de salida.
-    
-    Returns: Void
-    Raises:
-        IOError: Alguno de los ficheros no existe.
-    """
-    cProfile.run("testRun('"+in_file+"','"+out_file+"')")
+    if options.output:
+        document = {
+            "meta": {
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "size": options.size,
+                "warmup": options.warmup,
+                "trials": options.trials,
+                "seed": SEED,
+            },
+            "results": results,
+        }
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
 
+    return 1 if regressions else 0
 
 
 if __name__ == "__main__":
-    # Initialize input/output file lists to process.
-    # Comment/add/remove files as needed.
-    #in_files=["primosTest.txt","factorTest.txt","mcdTest.txt","potenciaTest.txt",
-    #            "invTest.txt","eulerTest.txt","sistemaTest.txt","cuadraticaTest.txt"]
-    #out_files=["primosTest_out.txt","factorTest_out.txt","mcdTest_out.txt","potenciaTest_out.txt",
-    #            "invTest_out.txt","eulerTest_out.txt","sistemaTest_out.txt","cuadraticaTest_out.txt"]
-    in_files=["ejemplosComandos.txt"]
-    out_files=["ejemplosSalida.txt"]
-    
-    # Collected timings
-    runtime=[]
-    for i in range(0,len(in_files)):
-        # Comment one line or the other to switch benchmarking/profiling
-        try:
-            runtime.append(measureTime(in_files[i],out_files[i]))
-        #    profile(in_files[i],out_files[i])
-        except IOError:
-            runtime.append(0)
-            print("File "+in_files[i]+" does not exist.\n")
-
-    print(runtime)
\ No newline at end of file
+    sys.exit(main())
@@ -2,37 +2,101 @@
 
 Number theory and modular arithmetic helpers used by IMAT-LAB and RSA utilities.
 
-Public API is re-exported from :mod:`modular.core`.
+Public API is re-exported from :mod:`modular.core`. Submodules are imported
+lazily on first attribute access, so ``import modular`` stays cheap.
 """
 
-from .core import (
-    are_coprime,
-    bezout,
-    euler_totient,
-    factorize,
-    gcd,
-    is_prime,
-    legendre_symbol,
-    list_primes,
-    mod_inverse,
-    mod_pow,
-    mod_sqrt,
-    quadratic_equation_mod_p,
-    solve_congruence_system,
-)
+from __future__ import annotations
+
+import importlib
+
+# Equivalent to typing.TYPE_CHECKING without the cost of importing typing.
+TYPE_CHECKING = False
+
+if TYPE_CHECKING:
+    from .core import (
+        are_coprime,
+        bezout,
+        discrete_log,
+        euler_totient,
+        factorize,
+        gcd,
+        is_prime,
+        jacobi_symbol,
+        kronecker_symbol,
+        legendre_symbol,
+        list_primes,
+        mod_inverse,
+        mod_pow,
+        mod_sqrt,
+        nth_prime,
+        prime_count,
+        quadratic_equation_mod_p,
+        quadratic_residues,
+        solve_congruence_system,
+    )
+    from .primetable import PrimeTable, build_prime_table, use_prime_table
+
+# Public name -> submodule that defines it.
+_EXPORTS = {
+    "PrimeTable": ".primetable",
+    "are_coprime": ".core",
+    "bezout": ".core",
+    "build_prime_table": ".primetable",
+    "discrete_log": ".core",
+    "euler_totient": ".core",
+    "factorize": ".core",
+    "gcd": ".core",
+    "is_prime": ".core",
+    "jacobi_symbol": ".core",
+    "kronecker_symbol": ".core",
+    "legendre_symbol": ".core",
+    "list_primes": ".core",
+    "mod_inverse": ".core",
+    "mod_pow": ".core",
+    "mod_sqrt": ".core",
+    "nth_prime": ".core",
+    "prime_count": ".core",
+    "quadratic_equation_mod_p": ".core",
+    "quadratic_residues": ".core",
+    "solve_congruence_system": ".core",
+    "use_prime_table": ".primetable",
+}
 
 __all__ = [
+    "PrimeTable",
     "are_coprime",
     "bezout",
+    "build_prime_table",
+    "discrete_log",
     "euler_totient",
     "factorize",
     "gcd",
     "is_prime",
+    "jacobi_symbol",
+    "kronecker_symbol",
     "legendre_symbol",
     "list_primes",
     "mod_inverse",
     "mod_pow",
     "mod_sqrt",
+    "nth_prime",
+    "prime_count",
     "quadratic_equation_mod_p",
+    "quadratic_residues",
     "solve_congruence_system",
+    "use_prime_table",
 ]
+
+
+def __getattr__(name: str):
+    submodule = _EXPORTS.get(name)
+    if submodule is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(submodule, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,15 +1,15 @@
 """Core number theory and modular arithmetic routines.
 
-This module intentionally avoids any I/O so it can be imported from scripts.
+This module intentionally avoids any I/O so it can be imported from scripts;
+the only exception is reading an opted-in prime table (see :mod:`.primetable`).
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass
 from math import isqrt
 from typing import Dict, List, Optional, Sequence, Tuple
 
-import numpy as np
+from .primetable import active_prime_table
 
 
 def is_prime(n: int) -> bool:
@@ -21,6 +21,16 @@ def is_prime(n: int) -> bool:
     if n % 2 == 0:
         return False
     limit = isqrt(n)
+    table = active_prime_table()
+    if table is not None:
+        if table.covers(n + 1):
+            return n in table
+        if table.covers(limit + 1):
+            # Only prime divisors need to be tried.
+            for candidate in table.range(3, limit + 1):
+                if n % candidate == 0:
+                    return False
+            return True
     for candidate in range(3, limit + 1, 2):
         if n % candidate == 0:
             return False
@@ -32,6 +42,10 @@ def list_primes(start: int, end: int) -> List[int]:
     if end <= 2:
         return []
 
+    table = active_prime_table()
+    if table is not None and table.covers(end):
+        return table.range(start, end).tolist()
+
     sieve = [1 for _ in range(end)]
     sieve[0] = 0
     if end > 1:
@@ -58,6 +72,107 @@ def list_primes(start: int, end: int) -> List[int]:
     return primes
 
 
+def prime_count(x: int) -> int:
+    """Number of primes p <= x, in O(x^(3/4)) time and O(sqrt(x)) memory.
+
+    Uses Lucy_Hedgehog's method: S(v) starts as the count of 2..v and, for
+    each prime p <= sqrt(x), loses the numbers whose smallest prime factor is
+    p. Only the O(sqrt(x)) values v = x // i are tracked, in two NumPy arrays.
+    """
+    if x < 2:
+        return 0
+
+    table = active_prime_table()
+    if table is not None and table.covers(x + 1):
+        return table.bounds(0, x + 1)[1]
+
+    import numpy as np
+
+    r = isqrt(x)
+    # small[v] = S(v) for v <= r; large[i] = S(x // i) for 1 <= i <= r.
+    small = np.arange(-1, r, dtype=np.int64)
+    small[0] = 0
+    large = np.zeros(r + 1, dtype=np.int64)
+    large[1:] = x // np.arange(1, r + 1, dtype=np.int64) - 1
+
+    def sieve_out(p: int) -> None:
+        below = int(small[p - 1])
+        square = p * p
+        top = min(r, x // square)
+        # x // (i * p) is large[i * p] while i * p <= r, else a small entry.
+        split = min(top, r // p)
+        large[1 : split + 1] -= large[p : split * p + 1 : p] - below
+        if split < top:
+            ip = np.arange(split + 1, top + 1, dtype=np.int64) * p
+            large[split + 1 : top + 1] -= small[x // ip] - below
+        if square <= r:
+            # v // p for v = p*p .. r is p, p+1, ... each repeated p times.
+            small[square:] -= np.repeat(small[p : r // p + 1], p)[: r + 1 - square] - below
+
+    root = isqrt(r)
+    for p in range(2, root + 1):
+        if small[p] != small[p - 1]:
+            sieve_out(p)
+    # small[] is now final, so the remaining primes can be read off it at once.
+    for p in (np.flatnonzero(small[root + 1 :] != small[root:-1]) + root + 1).tolist():
+        sieve_out(p)
+
+    return int(large[1])
+
+
+def _segment_primes(low: int, high: int) -> List[int]:
+    """Primes in [low, high) for low >= 2, by a segmented sieve."""
+    flags = bytearray([1]) * (high - low)
+    for p in list_primes(2, isqrt(high - 1) + 1):
+        first = max(p * p, (low + p - 1) // p * p)
+        if first < high:
+            flags[first - low :: p] = bytes(len(range(first, high, p)))
+    return [low + i for i, flag in enumerate(flags) if flag]
+
+
+def nth_prime(k: int) -> int:
+    """The k-th prime (nth_prime(1) == 2).
+
+    Counts primes up to an estimate of p_k with :func:`prime_count`, then
+    sieves the short gap between the estimate and p_k.
+    """
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    if k < 6:
+        return (2, 3, 5, 7, 11)[k - 1]
+
+    table = active_prime_table()
+    if table is not None and k <= len(table):
+        return int(table[k - 1])
+
+    from math import log
+
+    ln = log(k)
+    lnln = log(ln)
+    estimate = int(k * (ln + lnln - 1 + (lnln - 2) / ln))
+    count = prime_count(estimate)
+    window = max(1 << 16, isqrt(estimate))
+
+    if count < k:
+        low = estimate + 1
+        while True:
+            primes = _segment_primes(low, low + window)
+            if count + len(primes) >= k:
+                return primes[k - count - 1]
+            count += len(primes)
+            low += window
+
+    high = estimate + 1
+    while True:
+        low = max(2, high - window)
+        primes = _segment_primes(low, high)
+        # primes[-1] is the count-th prime.
+        if count - len(primes) < k:
+            return primes[k - count - 1]
+        count -= len(primes)
+        high = low
+
+
 def gcd(a: int, b: int) -> int:
     """Greatest common divisor using Euclid's algorithm."""
     x, y = abs(a), abs(b)
@@ -74,6 +189,10 @@ def bezout(a: int, b: int) -> Tuple[int, int, int]:
     if a == 0 and b == 0:
         return 0, 0, 0
 
+    # NumPy is only needed here, so it is imported on first use rather than
+    # at module load.
+    import numpy as np
+
     # Preserve the original logic (vector-based) but with clearer names.
     larger = a if a > b else b
     smaller = b if a > b else a
@@ -155,6 +274,18 @@ def factorize(n: int) -> Dict[int, int]:
 
     # Fast trial division for small-ish n.
     if remaining < 10**7:
+        table = active_prime_table()
+        if table is not None and table.covers(isqrt(remaining) + 1):
+            for candidate in table.range(2, isqrt(remaining) + 1):
+                if candidate * candidate > remaining:
+                    break
+                while remaining % candidate == 0:
+                    factors[candidate] = factors.get(candidate, 0) + 1
+                    remaining //= candidate
+            if remaining != 1:
+                factors[remaining] = factors.get(remaining, 0) + 1
+            return factors
+
         candidate = 2
         while candidate * candidate <= remaining:
             while remaining % candidate == 0:
@@ -204,8 +335,242 @@ def euler_totient(n: int) -> int:
     return result
 
 
+# Largest baby-step table (entries) discrete_log builds; bigger prime-order
+# subgroups are solved with Pollard's rho in constant memory instead.
+DLOG_MAX_TABLE = 1 << 18
+
+
+def _bsgs_log(gamma: int, beta: int, order: int, m: int, table_size: int) -> Optional[int]:
+    """Baby-step giant-step: x in [0, order) with gamma^x = beta (mod m), or None."""
+    baby: Dict[int, int] = {}
+    value = 1
+    for j in range(table_size):
+        baby.setdefault(value, j)
+        value = value * gamma % m
+    giant = pow(pow(gamma, table_size, m), -1, m)
+    value = beta
+    for i in range(-(-order // table_size)):
+        j = baby.get(value)
+        if j is not None:
+            return (i * table_size + j) % order
+        value = value * giant % m
+    return None
+
+
+def _rho_log(gamma: int, beta: int, order: int, m: int, attempts: int = 20) -> Optional[int]:
+    """Pollard's rho for logarithms in a subgroup of prime ``order``."""
+    import random
+
+    def step(x: int, a: int, b: int) -> Tuple[int, int, int]:
+        branch = x % 3
+        if branch == 0:
+            return x * beta % m, a, (b + 1) % order
+        if branch == 1:
+            return x * x % m, 2 * a % order, 2 * b % order
+        return x * gamma % m, (a + 1) % order, b
+
+    for _ in range(attempts):
+        a, b = random.randrange(order), random.randrange(order)
+        x = pow(gamma, a, m) * pow(beta, b, m) % m
+        x2, a2, b2 = x, a, b
+        while True:
+            x, a, b = step(x, a, b)
+            x2, a2, b2 = step(*step(x2, a2, b2))
+            if x == x2:
+                break
+        # gamma^a beta^b = gamma^a2 beta^b2, so log(beta) = (a - a2) / (b2 - b).
+        denominator = (b2 - b) % order
+        if gcd(denominator, order) != 1:
+            continue
+        log = (a - a2) * pow(denominator, -1, order) % order
+        if pow(gamma, log, m) == beta:
+            return log
+    return None
+
+
+# Miller-Rabin bases that make the test deterministic below 3.3 * 10^24.
+_MR_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+
+def _probable_prime(n: int) -> bool:
+    """Miller-Rabin test: exact below 3.3 * 10^24, probabilistic above.
+
+    Used where trial division (:func:`is_prime`) would cost O(sqrt(n)).
+    """
+    if n < 2:
+        return False
+    for p in _MR_BASES:
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in _MR_BASES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _subgroup_log(gamma: int, beta: int, order: int, m: int, max_table: int) -> Optional[int]:
+    if beta == 1:
+        return 0
+    if pow(beta, order, m) != 1:
+        return None  # beta cannot be a power of gamma
+    table_size = isqrt(order - 1) + 1
+    if table_size <= max_table:
+        return _bsgs_log(gamma, beta, order, m, table_size)
+    log = _rho_log(gamma, beta, order, m)
+    if log is None and not _probable_prime(order):
+        # factorize gave up on a composite order: capped BSGS is slow but exact.
+        log = _bsgs_log(gamma, beta, order, m, max_table)
+    return log
+
+
+def discrete_log(g: int, h: int, m: int, order: Optional[int] = None, max_table: int = DLOG_MAX_TABLE) -> Optional[int]:
+    """Smallest x >= 0 with g^x = h (mod m), or None if h is not a power of g.
+
+    Pohlig-Hellman: the order of g is factorized and x is found modulo each
+    prime power q^e, one base-q digit at a time, by solving a logarithm in the
+    subgroup of order q. Those use baby-step giant-step while the table stays
+    under ``max_table`` entries and Pollard's rho above it, so the cost is
+    about sqrt(largest q) group operations. The results are combined with the
+    CRT. ``order`` may be any multiple of the order of g (default φ(m)).
+    """
+    if m < 1:
+        raise ValueError("modulus must be positive")
+    if m == 1:
+        return 0
+    g %= m
+    h %= m
+    if gcd(g, m) != 1:
+        raise ValueError("g must be coprime to the modulus")
+    if gcd(h, m) != 1:
+        return None
+
+    if order is None:
+        # factorize() is slow on large primes, so skip it for a prime modulus.
+        order = m - 1 if _probable_prime(m) else euler_totient(m)
+    n = order
+    if n < 1 or pow(g, n, m) != 1:
+        raise ValueError("order is not a multiple of the order of g")
+    factors = {n: 1} if _probable_prime(n) else factorize(n)
+    # Reduce n to the exact order of g.
+    for q in list(factors):
+        while factors[q] and pow(g, n // q, m) == 1:
+            n //= q
+            factors[q] -= 1
+    factors = {q: e for q, e in factors.items() if e}
+    if pow(h, n, m) != 1:
+        return None  # h is outside <g>; no search needed
+
+    residues: List[int] = []
+    moduli: List[int] = []
+    for q, e in factors.items():
+        cofactor = n // q**e
+        g0, h0 = pow(g, cofactor, m), pow(h, cofactor, m)
+        gamma = pow(g0, q ** (e - 1), m)
+        g0_inverse = pow(g0, -1, m)
+        x = 0
+        for k in range(e):
+            target = pow(pow(g0_inverse, x, m) * h0 % m, q ** (e - 1 - k), m)
+            digit = _subgroup_log(gamma, target, q, m, max_table)
+            if digit is None:
+                return None
+            x += digit * q**k
+        residues.append(x)
+        moduli.append(q**e)
+
+    x = solve_congruence_system([1] * len(moduli), residues, moduli)[0] if moduli else 0
+    return x if pow(g, x, m) == h else None
+
+
+def jacobi_symbol(a: int, n: int) -> int:
+    """Jacobi symbol (a|n) for odd n > 0, without any exponentiation.
+
+    Factors of two are stripped from a in one shift and quadratic reciprocity
+    swaps the arguments, so the cost is that of a binary gcd.
+    """
+    if n <= 0 or n % 2 == 0:
+        raise ValueError("n must be a positive odd integer")
+    a %= n
+    result = 1
+    while a:
+        twos = (a & -a).bit_length() - 1
+        a >>= twos
+        # (2|n) = -1 exactly when n = 3 or 5 (mod 8).
+        if twos & 1 and n & 7 in (3, 5):
+            result = -result
+        # Reciprocity: the sign flips when both are 3 (mod 4).
+        if a & n & 2:
+            result = -result
+        a, n = n % a, a
+    return result if n == 1 else 0
+
+
+def kronecker_symbol(a: int, n: int) -> int:
+    """Kronecker symbol (a|n): the Jacobi symbol extended to every integer n."""
+    if n == 0:
+        return 1 if abs(a) == 1 else 0
+    result = 1
+    if n < 0:
+        n = -n
+        if a < 0:
+            result = -1
+    twos = (n & -n).bit_length() - 1
+    if twos:
+        if a % 2 == 0:
+            return 0
+        n >>= twos
+        if twos & 1 and a & 7 in (3, 5):
+            result = -result
+    return result * jacobi_symbol(a, n)
+
+
+def quadratic_residues(
+    values: Sequence[int], m: int, factors: Optional[Dict[int, int]] = None
+) -> List[bool]:
+    """For each value, whether it is coprime to m and a square modulo m.
+
+    m is factorized once (or ``factors`` is used) and each value is checked
+    against every prime power: Jacobi symbols for odd primes, residues mod 8
+    for powers of two. With a prime m this is one Jacobi symbol per value.
+    """
+    if m < 1:
+        raise ValueError("modulus must be positive")
+    if factors is None:
+        factors = factorize(m)
+    odd_primes = [p for p in factors if p != 2]
+    twos = factors.get(2, 0)
+    # Units that are squares mod 2^k: all (k = 1), 1 mod 4 (k = 2), 1 mod 8 (k >= 3).
+    mask = 0 if twos <= 1 else (3 if twos == 2 else 7)
+
+    results = []
+    for value in values:
+        if gcd(value, m) != 1:
+            results.append(False)
+        elif mask and value & mask != 1:
+            results.append(False)
+        else:
+            results.append(all(jacobi_symbol(value, p) == 1 for p in odd_primes))
+    return results
+
+
 def legendre_symbol(a: int, p: int) -> int:
-    """Compute the Legendre symbol (a|p) for odd prime p."""
+    """Compute the Legendre symbol (a|p) for odd prime p.
+
+    Odd composite p gives the Jacobi symbol. Other moduli keep the original
+    Euler's criterion result.
+    """
+    if p >= 3 and p % 2 == 1:
+        return jacobi_symbol(a, p)
     value = mod_pow(a, (p - 1) // 2, p)
     if value == p - 1:
         return -1
@@ -244,9 +609,15 @@ def solve_congruence_system(
 def mod_sqrt(n: int, p: int) -> Optional[int]:
     """Return a square root of n modulo p, or None if it doesn't exist.
 
-    Note: this keeps the original 'Cipolla-like' approach used in the lab code.
+    Note: this keeps the original 'Cipolla-like' approach used in the lab code,
+    which is only valid for prime p; odd composite moduli return None.
     """
-    if legendre_symbol(n, p) != 1:
+    if p >= 3 and p % 2 == 1:
+        # (n|p) = -1 rules n out for any odd p, but +1 only proves a square
+        # when p is prime.
+        if jacobi_symbol(n, p) != 1 or not is_prime(p):
+            return None
+    elif legendre_symbol(n, p) != 1:
         return None
 
     a = 0
@@ -0,0 +1,160 @@
+"""Persistent, memory-mapped table of small primes.
+
+The table is a binary file holding every prime below ``limit`` as a sorted
+array of little-endian unsigned integers (uint32 when they fit, else
+uint64)::
+
+    file   := MAGIC limit:u64 count:u64 itemsize:u32 reserved:u32 prime*count
+
+It is built once with :func:`build_prime_table` and then mapped read-only, so
+every process that opens it shares the same page-cache pages instead of
+sieving its own copy. Range queries use bisection directly on the mapping and
+return zero-copy views (a ``memoryview``, or a NumPy array with
+:meth:`PrimeTable.array`).
+
+:func:`use_prime_table` makes a table the active one for this process: while
+one is active, ``list_primes``, ``is_prime`` and the trial division in
+``factorize`` read from it whenever the requested range is covered. The path
+is also exported in ``MODULAR_PRIME_TABLE`` so child processes pick the same
+file up on first use.
+"""
+
+from __future__ import annotations
+
+import bisect
+import itertools
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Optional, Tuple
+
+MAGIC = b"PRIMTBL1"
+ENV_VAR = "MODULAR_PRIME_TABLE"
+
+# Primes below this bound are stored when no limit is given (664579 primes, ~2.6 MB).
+DEFAULT_LIMIT = 10**7
+
+_HEADER = struct.Struct("<8sQQII")
+_TYPECODES = {4: "I", 8: "Q"}
+
+
+def build_prime_table(path: str, limit: int = DEFAULT_LIMIT) -> None:
+    """Sieve the primes below ``limit`` and write them to ``path`` atomically."""
+    if limit < 2:
+        raise ValueError("prime table limit must be at least 2")
+    flags = bytearray([1]) * limit
+    flags[0] = flags[1] = 0
+    for p in range(2, int(limit**0.5) + 1):
+        if flags[p]:
+            flags[p * p :: p] = bytes(len(range(p * p, limit, p)))
+    itemsize = 4 if limit <= 2**32 else 8
+    primes = array(_TYPECODES[itemsize], itertools.compress(range(limit), flags))
+    if primes.itemsize != itemsize:
+        raise ValueError("no native unsigned integer type of the required width")
+    if sys.byteorder != "little":
+        primes.byteswap()
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, limit, len(primes), itemsize, 0))
+        primes.tofile(f)
+    os.replace(tmp, path)
+
+
+class PrimeTable:
+    """Read-only view of a prime table file.
+
+    Holds every prime ``p < limit``. Slices and range queries do not copy.
+    """
+
+    def __init__(self, path: str) -> None:
+        if sys.byteorder != "little":
+            raise ValueError("prime tables can only be mapped on little-endian hosts")
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            self._map.close()
+            raise ValueError(f"{path} is not a prime table")
+        magic, self.limit, self.count, self.itemsize, _reserved = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or self.itemsize not in _TYPECODES or len(self._map) < self._end():
+            self._map.close()
+            raise ValueError(f"{path} is not a prime table")
+        self._view = memoryview(self._map)[_HEADER.size : self._end()].cast(_TYPECODES[self.itemsize])
+
+    def _end(self) -> int:
+        return _HEADER.size + self.count * self.itemsize
+
+    def close(self) -> None:
+        self._view.release()
+        self._map.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index):
+        return self._view[index]
+
+    def covers(self, end: int) -> bool:
+        """Whether every prime below ``end`` is in the table."""
+        return end <= self.limit
+
+    def bounds(self, start: int, end: int) -> Tuple[int, int]:
+        """Index range of the primes in [start, end)."""
+        low = bisect.bisect_left(self._view, max(start, 0))
+        high = bisect.bisect_left(self._view, max(end, 0), low)
+        return low, high
+
+    def range(self, start: int, end: int) -> memoryview:
+        """Primes in [start, end) (up to ``limit``) as a zero-copy memoryview."""
+        low, high = self.bounds(start, end)
+        return self._view[low:high]
+
+    def array(self, start: int = 0, end: Optional[int] = None):
+        """Primes in [start, end) as a read-only NumPy array backed by the file."""
+        import numpy as np
+
+        low, high = self.bounds(start, self.limit if end is None else end)
+        dtype = np.dtype(f"<u{self.itemsize}")
+        return np.frombuffer(self._map, dtype=dtype, count=high - low, offset=_HEADER.size + low * self.itemsize)
+
+    def __contains__(self, n: int) -> bool:
+        index = bisect.bisect_left(self._view, n)
+        return index < self.count and self._view[index] == n
+
+
+_active: Optional[PrimeTable] = None
+_env_checked = False
+
+
+def use_prime_table(path: Optional[str], limit: int = DEFAULT_LIMIT) -> Optional[PrimeTable]:
+    """Make the table at ``path`` the active one, building it if missing.
+
+    ``None`` deactivates the current table.
+    """
+    global _active, _env_checked
+    _env_checked = True
+    if path is None:
+        _active = None
+        os.environ.pop(ENV_VAR, None)
+        return None
+    if not os.path.isfile(path):
+        build_prime_table(path, limit)
+    _active = PrimeTable(path)
+    os.environ[ENV_VAR] = path
+    return _active
+
+
+def active_prime_table() -> Optional[PrimeTable]:
+    """The active table, opening ``$MODULAR_PRIME_TABLE`` on first call."""
+    global _active, _env_checked
+    if not _env_checked:
+        _env_checked = True
+        path = os.environ.get(ENV_VAR)
+        if path and os.path.isfile(path):
+            try:
+                _active = PrimeTable(path)
+            except (OSError, ValueError):
+                _active = None
+    return _active
@@ -0,0 +1,143 @@
+"""
+relay_loadtest.py
+
+Load test for the WebSocket relay and the asyncio chat client.
+
+Pairs of :class:`chat_relay.RelayClient` peers exchange messages through the
+relay (an in-process :class:`chat_relay.LocalRelay` unless ``--url`` points at
+a running ``server.ts``). Every message carries its send time, so the
+receiver can measure end-to-end latency, including encryption and decryption
+in the process pool.
+
+``--check-reconnect`` instead drops the sender's connection while a long
+message is still being encrypted, then checks that both that message and a
+later one still arrive after the reconnect, and that a frame which is not
+valid UTF-8 is skipped by the receiver.
+
+Usage:
+    python relay_loadtest.py --pairs 4 --messages 200
+    python relay_loadtest.py --url ws://localhost:3000
+    python relay_loadtest.py --check-reconnect
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import rsa
+from chat_relay import OP_BINARY, LocalRelay, RelayClient, ws_connect
+
+
+async def run_pair(url: str, pool: ProcessPoolExecutor, index: int, messages: int, size: int,
+                   bounds: tuple, padding: int) -> List[float]:
+    """Send ``messages`` texts from one peer to another; return latencies in seconds."""
+    n1, e1, d1 = rsa.generate_keys(*bounds)
+    n2, e2, d2 = rsa.generate_keys(*bounds)
+    async with RelayClient(url, f"sender{index}", n1, e1, d1, padding, pool) as sender, \
+            RelayClient(url, f"receiver{index}", n2, e2, d2, padding, pool) as receiver:
+        await sender.connected.wait()
+        await receiver.connected.wait()
+
+        filler = "x" * size
+        for _ in range(messages):
+            await sender.send(n2, e2, f"{time.perf_counter():.9f} {filler}")
+
+        latencies = []
+        for _ in range(messages):
+            message = await receiver.receive()
+            sent_at = float(message.text.split(" ", 1)[0])
+            latencies.append(time.perf_counter() - sent_at)
+        return latencies
+
+
+async def check_reconnect(url: str, pool: ProcessPoolExecutor, bounds: tuple, padding: int) -> None:
+    """Reconnect while an encryption is in flight; raise AssertionError if anything is lost."""
+    n1, e1, d1 = rsa.generate_keys(*bounds)
+    n2, e2, d2 = rsa.generate_keys(*bounds)
+    async with RelayClient(url, "sender", n1, e1, d1, padding, pool) as sender, \
+            RelayClient(url, "receiver", n2, e2, d2, padding, pool) as receiver:
+        await sender.connected.wait()
+        await receiver.connected.wait()
+
+        long_text = "x" * 200_000
+        await sender.send(n2, e2, long_text)
+        sender._ws.writer.transport.abort()
+        await sender.send(n2, e2, "hello")
+
+        stray = await ws_connect(url)
+        await stray.send_message(OP_BINARY, b"\xff\xfe")
+        await stray.close()
+
+        await asyncio.wait_for(sender.wait_outgoing(), 60)
+        texts = [(await asyncio.wait_for(receiver.receive(), 60)).text for _ in range(2)]
+        assert texts == [long_text, "hello"], f"received {[t[:10] for t in texts]}"
+
+
+async def main_async(options) -> None:
+    with ProcessPoolExecutor(max_workers=options.workers) as pool:
+        # Start the workers before the relay so they don't inherit its socket.
+        await asyncio.get_running_loop().run_in_executor(pool, int)
+
+        relay = None
+        url = options.url
+        if url is None:
+            relay = LocalRelay()
+            await relay.start()
+            url = relay.url
+
+        if options.check_reconnect:
+            try:
+                await check_reconnect(url, pool, (options.min_prime, options.max_prime), options.padding)
+            finally:
+                if relay is not None:
+                    await relay.close()
+            print("reconnect check: ok")
+            return
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(
+                run_pair(url, pool, i, options.messages, options.size, (options.min_prime, options.max_prime),
+                         options.padding)
+                for i in range(options.pairs)
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+        if relay is not None:
+            await relay.close()
+
+    latencies = sorted(lat for pair in results for lat in pair)
+    total = len(latencies)
+    print(f"messages:    {total}")
+    print(f"throughput:  {total / elapsed:.1f} msg/s")
+    print(f"latency p50: {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"latency p99: {latencies[min(total - 1, int(0.99 * total))] * 1000:.2f} ms")
+    print(f"latency max: {latencies[-1] * 1000:.2f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="relay to use (default: start a local stand-in)")
+    parser.add_argument("--pairs", type=int, default=4, help="sender/receiver pairs")
+    parser.add_argument("--messages", type=int, default=200, help="messages per pair")
+    parser.add_argument("--size", type=int, default=32, help="extra characters per message")
+    parser.add_argument("--padding", type=int, default=2, help="decimal padding digits")
+    parser.add_argument("--workers", type=int, default=None, help="crypto worker processes")
+    parser.add_argument("--min-prime", type=int, default=1000, help="lower bound for key primes")
+    parser.add_argument("--max-prime", type=int, default=5000, help="upper bound for key primes")
+    parser.add_argument("--check-reconnect", action="store_true",
+                        help="check that a reconnect during encryption loses no messages, then exit")
+    options = parser.parse_args()
+    asyncio.run(main_async(options))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
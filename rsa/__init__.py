@@ -1,26 +1,77 @@
 """rsa package
 
-RSA utilities (key generation, integer and string encryption/decryption).
+RSA utilities (key generation, a background keypair pool, key objects with a
+binary encoding, integer and string encryption/decryption).
 
 Attack/cryptanalysis helpers live outside the package in `rsa_attacks.py`.
+Submodules are imported lazily on first attribute access, so ``import rsa``
+stays cheap.
 """
 
-from .core import (
-    apply_padding,
-    decrypt_int,
-    decrypt_string,
-    encrypt_int,
-    encrypt_string,
-    generate_keys,
-    remove_padding,
-)
+from __future__ import annotations
+
+import importlib
+
+# Equivalent to typing.TYPE_CHECKING without the cost of importing typing.
+TYPE_CHECKING = False
+
+if TYPE_CHECKING:
+    from .core import (
+        apply_padding,
+        decrypt_int,
+        decrypt_string,
+        encrypt_int,
+        encrypt_string,
+        generate_keys,
+        remove_padding,
+    )
+    from .keys import PrivateKey, PublicKey, generate_keypair, load_armored, load_key, load_keys
+    from .pool import KeyPool
+
+# Public name -> submodule that defines it.
+_EXPORTS = {
+    "KeyPool": ".pool",
+    "PrivateKey": ".keys",
+    "PublicKey": ".keys",
+    "apply_padding": ".core",
+    "decrypt_int": ".core",
+    "decrypt_string": ".core",
+    "encrypt_int": ".core",
+    "encrypt_string": ".core",
+    "generate_keypair": ".keys",
+    "generate_keys": ".core",
+    "load_armored": ".keys",
+    "load_key": ".keys",
+    "load_keys": ".keys",
+    "remove_padding": ".core",
+}
 
 __all__ = [
+    "KeyPool",
+    "PrivateKey",
+    "PublicKey",
     "apply_padding",
     "decrypt_int",
     "decrypt_string",
     "encrypt_int",
     "encrypt_string",
+    "generate_keypair",
     "generate_keys",
+    "load_armored",
+    "load_key",
+    "load_keys",
     "remove_padding",
 ]
+
+
+def __getattr__(name: str):
+    submodule = _EXPORTS.get(name)
+    if submodule is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(submodule, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -20,7 +20,19 @@ def generate_keys(min_prime: int, max_prime: int) -> Tuple[int, int, int]:
     Note: this keeps the original lab convention where 'd' is picked first and
     'e' is computed as its modular inverse modulo φ(n).
     """
-    primes = modular.list_primes(min_prime, max_prime)
+    return _keys_from_primes(modular.list_primes(min_prime, max_prime))
+
+
+def _keys_from_primes(primes: List[int]) -> Tuple[int, int, int]:
+    """Generate RSA keys from two distinct primes picked at random from ``primes``.
+
+    Lets callers that need many keys for the same interval sieve it only once.
+    """
+    return _keys_from_pair(*_prime_pair(primes))
+
+
+def _prime_pair(primes: List[int]) -> Tuple[int, int]:
+    """Two distinct primes picked at random from ``primes``."""
     if len(primes) < 2:
         raise ValueError("prime interval must contain at least two primes")
 
@@ -31,7 +43,11 @@ def generate_keys(min_prime: int, max_prime: int) -> Tuple[int, int, int]:
         attempts += 1
         if attempts >= 20:
             raise ValueError("interval appears to contain only one prime")
+    return p1, p2
+
 
+def _keys_from_pair(p1: int, p2: int) -> Tuple[int, int, int]:
+    """(n, e, d) for the primes p1 and p2, following the lab convention."""
     n = p1 * p2
     phi = (p1 - 1) * (p2 - 1)
 
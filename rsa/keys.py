@@ -0,0 +1,197 @@
+"""RSA key objects with a compact binary encoding.
+
+Keys are serialized as::
+
+    key   := MAGIC:4s version:u8 kind:u8 count:u16 field*count
+    field := length:u32 value
+
+where each ``value`` is a big-endian unsigned integer of ``length`` bytes
+(``length`` 0 encodes 0). Public keys store (n, e); private keys store
+(n, e, d, p, q, dp, dq, qinv), with the CRT fields set to 0 when the primes
+are unknown. Everything derived from the primes is stored, so loading a key
+only converts bytes to ints and never recomputes an inverse. Encoded keys can
+be concatenated and read back with :func:`load_keys`.
+
+:meth:`PublicKey.armor` / :func:`load_armored` wrap the encoding in a
+PEM-like base64 text block for copy and paste.
+"""
+
+from __future__ import annotations
+
+import base64
+import struct
+from dataclasses import dataclass
+from typing import List, Tuple, Union
+
+import modular
+
+from .core import _keys_from_pair, _prime_pair, apply_padding, remove_padding
+
+MAGIC = b"RSAK"
+VERSION = 1
+
+_PUBLIC = 1
+_PRIVATE = 2
+_LABELS = {_PUBLIC: "IMAT RSA PUBLIC KEY", _PRIVATE: "IMAT RSA PRIVATE KEY"}
+
+_HEADER = struct.Struct(">4sBBH")
+_LENGTH = struct.Struct(">I")
+
+
+def _encode(kind: int, fields: Tuple[int, ...]) -> bytes:
+    parts = [_HEADER.pack(MAGIC, VERSION, kind, len(fields))]
+    for value in fields:
+        raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+        parts.append(_LENGTH.pack(len(raw)))
+        parts.append(raw)
+    return b"".join(parts)
+
+
+def _decode(data, offset: int = 0) -> Tuple[int, List[int], int]:
+    """Parse one key at ``offset``; returns (kind, fields, next offset)."""
+    if len(data) - offset < _HEADER.size:
+        raise ValueError("truncated key")
+    magic, version, kind, count = _HEADER.unpack_from(data, offset)
+    if magic != MAGIC:
+        raise ValueError("not an encoded RSA key")
+    if version != VERSION:
+        raise ValueError(f"unsupported key version {version}")
+    offset += _HEADER.size
+    # Hot loop when loading many keys: bounds are checked once at the end
+    # (unpack_from raises on a short length prefix, slicing just stops short).
+    unpack_length = _LENGTH.unpack_from
+    from_bytes = int.from_bytes
+    fields = []
+    try:
+        for _ in range(count):
+            (length,) = unpack_length(data, offset)
+            offset += 4
+            fields.append(from_bytes(data[offset : offset + length], "big"))
+            offset += length
+    except struct.error:
+        raise ValueError("truncated key") from None
+    if offset > len(data):
+        raise ValueError("truncated key")
+    return kind, fields, offset
+
+
+@dataclass(frozen=True)
+class PublicKey:
+    """RSA public key (n, e)."""
+
+    n: int
+    e: int
+
+    def to_bytes(self) -> bytes:
+        return _encode(_PUBLIC, (self.n, self.e))
+
+    def armor(self) -> str:
+        return _armor(_PUBLIC, self.to_bytes())
+
+    def encrypt_int(self, message_int: int, padding_digits: int) -> int:
+        return pow(apply_padding(message_int, padding_digits), self.e, self.n)
+
+    def encrypt_string(self, text: str, padding_digits: int) -> List[int]:
+        return [self.encrypt_int(ord(ch), padding_digits) for ch in text]
+
+
+@dataclass(frozen=True)
+class PrivateKey:
+    """RSA private key.
+
+    When the primes p and q are known, the CRT exponents dp = d mod (p-1),
+    dq = d mod (q-1) and qinv = q^-1 mod p are kept too and decryption uses
+    them (two half-size exponentiations instead of one full one).
+    """
+
+    n: int
+    e: int
+    d: int
+    p: int = 0
+    q: int = 0
+    dp: int = 0
+    dq: int = 0
+    qinv: int = 0
+
+    @classmethod
+    def from_primes(cls, p: int, q: int) -> "PrivateKey":
+        """Key for the primes p and q, exponents chosen like rsa.generate_keys."""
+        n, e, d = _keys_from_pair(p, q)
+        return cls(n, e, d, p, q, d % (p - 1), d % (q - 1), pow(q, -1, p))
+
+    @property
+    def public_key(self) -> PublicKey:
+        return PublicKey(self.n, self.e)
+
+    def to_bytes(self) -> bytes:
+        return _encode(_PRIVATE, (self.n, self.e, self.d, self.p, self.q, self.dp, self.dq, self.qinv))
+
+    def armor(self) -> str:
+        return _armor(_PRIVATE, self.to_bytes())
+
+    def decrypt_int(self, cipher_int: int, padding_digits: int) -> int:
+        if self.p and self.q:
+            m1 = pow(cipher_int, self.dp, self.p)
+            m2 = pow(cipher_int, self.dq, self.q)
+            padded = m2 + self.q * (self.qinv * (m1 - m2) % self.p)
+        else:
+            padded = pow(cipher_int, self.d, self.n)
+        return remove_padding(padded, padding_digits)
+
+    def decrypt_string(self, cipher_list: List[int], padding_digits: int) -> str:
+        return "".join(chr(self.decrypt_int(c, padding_digits)) for c in cipher_list)
+
+
+Key = Union[PublicKey, PrivateKey]
+
+
+def generate_keypair(min_prime: int, max_prime: int) -> PrivateKey:
+    """Like rsa.generate_keys, but returns a PrivateKey that keeps its primes."""
+    return PrivateKey.from_primes(*_prime_pair(modular.list_primes(min_prime, max_prime)))
+
+
+def _key(kind: int, fields: List[int]) -> Key:
+    if kind == _PUBLIC and len(fields) == 2:
+        return PublicKey(*fields)
+    if kind == _PRIVATE and len(fields) == 8:
+        return PrivateKey(*fields)
+    raise ValueError("malformed RSA key")
+
+
+def load_key(data: bytes) -> Key:
+    """Decode one key written by ``to_bytes``."""
+    kind, fields, end = _decode(data)
+    if end != len(data):
+        raise ValueError("trailing data after key")
+    return _key(kind, fields)
+
+
+def load_keys(data: bytes) -> List[Key]:
+    """Decode a concatenation of encoded keys."""
+    view = memoryview(data)
+    keys = []
+    offset = 0
+    while offset < len(view):
+        kind, fields, offset = _decode(view, offset)
+        keys.append(_key(kind, fields))
+    return keys
+
+
+def _armor(kind: int, raw: bytes) -> str:
+    text = base64.b64encode(raw).decode("ascii")
+    lines = [text[i : i + 64] for i in range(0, len(text), 64)]
+    label = _LABELS[kind]
+    return "\n".join([f"-----BEGIN {label}-----", *lines, f"-----END {label}-----"]) + "\n"
+
+
+def load_armored(text: str) -> Key:
+    """Decode a key from the text produced by ``armor``."""
+    lines = [line.strip() for line in text.strip().splitlines()]
+    if len(lines) < 2 or not lines[0].startswith("-----BEGIN ") or not lines[-1].startswith("-----END "):
+        raise ValueError("not an armored RSA key")
+    label = lines[0][len("-----BEGIN ") : -len("-----")]
+    key = load_key(base64.b64decode("".join(lines[1:-1]), validate=True))
+    expected = _LABELS[_PUBLIC if isinstance(key, PublicKey) else _PRIVATE]
+    if label != expected or lines[-1] != f"-----END {label}-----":
+        raise ValueError("armor label does not match the key")
+    return key
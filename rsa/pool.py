@@ -0,0 +1,221 @@
+"""Background pool of pre-generated RSA keypairs.
+
+Key generation sieves the whole prime interval, which blocks interactive
+callers. A :class:`KeyPool` keeps up to a target number of ready keypairs per
+interval ``(min_prime, max_prime)`` and refills them in worker processes;
+:meth:`KeyPool.take` hands out a pooled key immediately and only generates one
+synchronously when the pool for that interval is empty.
+
+The pool can be spooled to disk so that a restart does not begin empty. The
+spool holds private exponents, so it is always encrypted with a key derived
+from a passphrase (PBKDF2-HMAC-SHA256, SHAKE-256 keystream and an HMAC-SHA256
+tag; standard library only). Keys are removed from the spool as they are
+handed out, so a key is never given out twice.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, List, Optional, Tuple
+
+import modular
+
+from .core import _keys_from_primes, generate_keys
+from .stream import keystream, xor
+
+Interval = Tuple[int, int]
+Keypair = Tuple[int, int, int]
+
+# Keypairs kept ready for an interval that was not configured explicitly.
+DEFAULT_TARGET = 4
+
+# Keypairs generated per worker task (the interval is sieved once per task).
+BATCH = 4
+
+SPOOL_MAGIC = b"RSAPOOL1"
+_SALT_SIZE = 16
+_NONCE_SIZE = 16
+_TAG_SIZE = 32
+_KDF_ITERATIONS = 200_000
+_STREAM_DOMAIN = b"rsa-keypool"
+
+
+def _generate_batch(min_prime: int, max_prime: int, count: int) -> List[Keypair]:
+    """Worker task: ``count`` keypairs from a single sieve of the interval."""
+    primes = modular.list_primes(min_prime, max_prime)
+    return [_keys_from_primes(primes) for _ in range(count)]
+
+
+class KeyPool:
+    """Pre-generated keypairs per prime interval, refilled by worker processes.
+
+    ``targets`` maps ``(min_prime, max_prime)`` to the number of keypairs kept
+    ready. Intervals requested through :meth:`take` without a target get
+    ``default_target``. ``spool`` and ``passphrase`` must be given together.
+    """
+
+    def __init__(
+        self,
+        targets: Optional[Dict[Interval, int]] = None,
+        workers: Optional[int] = None,
+        spool: Optional[str] = None,
+        passphrase: Optional[str] = None,
+        default_target: int = DEFAULT_TARGET,
+        batch: int = BATCH,
+    ) -> None:
+        if (spool is None) != (passphrase is None):
+            raise ValueError("spool and passphrase must be given together")
+        self.targets: Dict[Interval, int] = dict(targets or {})
+        self.workers = workers
+        self.spool = spool
+        self.default_target = default_target
+        self.batch = max(1, batch)
+        # Reentrant: a task that is already done runs its callback on submit.
+        self._lock = threading.RLock()
+        self._ready: Dict[Interval, Deque[Keypair]] = {}
+        self._pending: Dict[Interval, int] = {}
+        self._failed: Dict[Interval, BaseException] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._closed = False
+        self._spool_key = b""
+        self._salt = b""
+        if spool is not None:
+            self._open_spool(spool, passphrase)
+
+    def __enter__(self) -> "KeyPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # Spool
+
+    def _derive(self, passphrase: str, salt: bytes) -> None:
+        self._salt = salt
+        self._spool_key = hashlib.pbkdf2_hmac("sha256", passphrase.encode("utf-8"), salt, _KDF_ITERATIONS)
+
+    def _open_spool(self, path: str, passphrase: str) -> None:
+        if not os.path.isfile(path):
+            self._derive(passphrase, os.urandom(_SALT_SIZE))
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        header = len(SPOOL_MAGIC) + _SALT_SIZE + _NONCE_SIZE
+        if len(data) < header + _TAG_SIZE or not data.startswith(SPOOL_MAGIC):
+            raise ValueError(f"{path} is not a keypair spool")
+        salt = data[len(SPOOL_MAGIC) : len(SPOOL_MAGIC) + _SALT_SIZE]
+        nonce = data[len(SPOOL_MAGIC) + _SALT_SIZE : header]
+        ciphertext, tag = data[header:-_TAG_SIZE], data[-_TAG_SIZE:]
+        self._derive(passphrase, salt)
+        if not hmac.compare_digest(tag, hmac.new(self._spool_key, nonce + ciphertext, hashlib.sha256).digest()):
+            raise ValueError("wrong passphrase or corrupted keypair spool")
+        payload = json.loads(xor(ciphertext, keystream(_STREAM_DOMAIN, self._spool_key, nonce, len(ciphertext))))
+        for low, high, keys in payload["pools"]:
+            self._ready[(low, high)] = deque((int(n), int(e), int(d)) for n, e, d in keys)
+
+    def _save_spool(self) -> None:
+        """Rewrite the spool with the keypairs currently ready. Caller holds the lock."""
+        if self.spool is None:
+            return
+        payload = {
+            "pools": [
+                [low, high, [[str(n), str(e), str(d)] for n, e, d in keys]]
+                for (low, high), keys in self._ready.items()
+            ]
+        }
+        plaintext = json.dumps(payload).encode("utf-8")
+        nonce = os.urandom(_NONCE_SIZE)
+        ciphertext = xor(plaintext, keystream(_STREAM_DOMAIN, self._spool_key, nonce, len(plaintext)))
+        tag = hmac.new(self._spool_key, nonce + ciphertext, hashlib.sha256).digest()
+        tmp = self.spool + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(SPOOL_MAGIC + self._salt + nonce + ciphertext + tag)
+        os.replace(tmp, self.spool)
+
+    # Refilling
+
+    def start(self) -> None:
+        """Start refilling every configured interval in the background."""
+        with self._lock:
+            for interval in self.targets:
+                self._refill(interval)
+
+    def _refill(self, interval: Interval) -> None:
+        """Submit generation tasks up to the target. Caller holds the lock."""
+        target = self.targets.get(interval, self.default_target)
+        while not self._closed and interval not in self._failed:
+            missing = target - len(self._ready.get(interval, ())) - self._pending.get(interval, 0)
+            if missing <= 0:
+                break
+            count = min(self.batch, missing)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            try:
+                future = self._executor.submit(_generate_batch, interval[0], interval[1], count)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed). Start a new pool on the next
+                # refill; take() generates synchronously until then.
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                break
+            self._pending[interval] = self._pending.get(interval, 0) + count
+            future.add_done_callback(lambda f, interval=interval, count=count: self._filled(interval, count, f))
+
+    def _filled(self, interval: Interval, count: int, future: Future) -> None:
+        with self._lock:
+            self._pending[interval] -= count
+            if future.cancelled():
+                return
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                return  # not the interval's fault; the next _refill replaces the pool
+            if error is not None:
+                # Bad interval: stop retrying; take() reports the error itself.
+                self._failed[interval] = error
+                return
+            self._ready.setdefault(interval, deque()).extend(future.result())
+            self._save_spool()
+            self._refill(interval)
+
+    # Public API
+
+    def available(self, min_prime: int, max_prime: int) -> int:
+        """Number of keypairs ready for the interval."""
+        with self._lock:
+            return len(self._ready.get((min_prime, max_prime), ()))
+
+    def take(self, min_prime: int, max_prime: int) -> Keypair:
+        """Return ``(n, e, d)`` for the interval without waiting for the workers.
+
+        Generates the keypair synchronously only when none is ready, and
+        schedules a refill either way.
+        """
+        interval = (min_prime, max_prime)
+        with self._lock:
+            self.targets.setdefault(interval, self.default_target)
+            ready = self._ready.get(interval)
+            keypair = ready.popleft() if ready else None
+            if keypair is not None:
+                self._save_spool()
+            self._refill(interval)
+        if keypair is None:
+            keypair = generate_keys(min_prime, max_prime)
+        return keypair
+
+    def close(self, wait: bool = True) -> None:
+        """Stop the workers, dropping queued tasks, and save the spool."""
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        with self._lock:
+            self._save_spool()
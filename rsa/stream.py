@@ -0,0 +1,21 @@
+"""Standard-library stream cipher primitives shared by the encrypted stores.
+
+The keystream is SHAKE-256 over (domain, key, nonce); ``domain`` keeps the
+streams of different uses apart even under the same key. Callers add their
+own HMAC tag. Like the rest of this package it is meant for teaching, not for
+protecting real secrets.
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+
+def keystream(domain: bytes, key: bytes, nonce: bytes, length: int) -> bytes:
+    """``length`` keystream bytes for ``key`` and ``nonce``."""
+    return hashlib.shake_256(domain + key + nonce).digest(length)
+
+
+def xor(data: bytes, stream: bytes) -> bytes:
+    """XOR ``data`` with an equally long ``stream``."""
+    return (int.from_bytes(data, "big") ^ int.from_bytes(stream, "big")).to_bytes(len(data), "big")
@@ -0,0 +1,112 @@
+"""
+startup_benchmark.py
+
+Cold-start time budget check for `modular`, `rsa` and `imatlab`.
+
+The packages load their submodules lazily, so a bare ``import modular`` says
+little about startup cost. Each scenario is instead a snippet that touches a
+real entry point (``modular.gcd`` pulls in ``modular.core``), run in a fresh
+interpreter under ``python -X importtime``. The cumulative times of the
+top-level imports the snippet triggers (including lazy ones) are summed and
+compared against a budget in milliseconds; imports done by interpreter
+startup are left out. The median of several runs is used to smooth out noise.
+
+Usage:
+    python startup_benchmark.py
+    python startup_benchmark.py --runs 9 --budget modular.gcd=20 --budget imatlab=50
+
+Exits with status 1 when any scenario goes over its budget.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+# Snippet timed for each scenario.
+SCENARIOS: Dict[str, str] = {
+    "modular.gcd": "import modular; modular.gcd",
+    "rsa.generate_keys": "import rsa; rsa.generate_keys",
+    "imatlab": "import imatlab",
+}
+
+# Cold-start budget per scenario, in milliseconds.
+BUDGETS_MS: Dict[str, float] = {
+    "modular.gcd": 45.0,
+    "rsa.generate_keys": 45.0,
+    "imatlab": 90.0,
+}
+
+# Fresh interpreters started per scenario.
+RUNS = 5
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Written to stderr before the snippet runs, separating its imports from startup's.
+_MARKER = "-- startup_benchmark --"
+
+
+def startup_time_ms(snippet: str) -> float:
+    """Cumulative import time of the imports ``snippet`` triggers in a new interpreter, in ms."""
+    program = f"import sys\nsys.stderr.write({_MARKER!r} + '\\n')\n{snippet}\n"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", program],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=_HERE,
+    )
+    lines = completed.stderr.splitlines()
+    if _MARKER not in lines:
+        raise RuntimeError("no import time reported")
+    total = 0
+    # Lines look like: "import time:   self [us] | cumulative | imported package",
+    # with two more spaces of indentation per nesting level.
+    for line in lines[lines.index(_MARKER) + 1 :]:
+        parts = line.split("|")
+        if len(parts) == 3 and line.startswith("import time:") and not parts[2].startswith("  "):
+            total += int(parts[1])
+    return total / 1000
+
+
+def measure(snippet: str, runs: int) -> float:
+    """Median cold-start time of ``snippet`` over ``runs`` interpreters."""
+    samples: List[float] = [startup_time_ms(snippet) for _ in range(runs)]
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=RUNS, help="interpreters started per scenario")
+    parser.add_argument(
+        "--budget",
+        action="append",
+        default=[],
+        metavar="NAME=MS",
+        help=f"override a scenario budget ({', '.join(SCENARIOS)})",
+    )
+    options = parser.parse_args()
+
+    budgets = dict(BUDGETS_MS)
+    for item in options.budget:
+        name, _, value = item.partition("=")
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+        budgets[name] = float(value)
+
+    failed = False
+    for name, budget in budgets.items():
+        elapsed = measure(SCENARIOS[name], options.runs)
+        status = "ok" if elapsed <= budget else "OVER BUDGET"
+        failed = failed or elapsed > budget
+        print(f"{name:<20}{elapsed:>8.2f} ms  (budget {budget:.1f} ms)  {status}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())